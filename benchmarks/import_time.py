@@ -0,0 +1,54 @@
+"""
+How long it takes to get the game ready to deal, in fresh interpreters.
+
+    python -m benchmarks.import_time [--runs 20]
+
+Compares importing the engine (card modules are loaded as their cards are dealt), importing
+every card module up front like the server used to, and dealing a first 4 player deck.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    'import bwc.engine': "import bwc.engine",
+    'import every card module': "import bwc.engine\nfrom bwc.cards import *",
+    'import bwc.engine + first deck': "import bwc.engine, random\n"
+                                      "bwc.engine.cardreader.make_deck(40, rng=random.Random(1))",
+}
+
+CHILD = """
+import sys
+from time import perf_counter
+start = perf_counter()
+{code}
+elapsed = perf_counter() - start
+print(elapsed, sum(name.startswith('bwc.cards.') for name in sys.modules))
+"""
+
+
+def measure(code: str, runs: int):
+    times = []
+    modules = 0
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CHILD.format(code=code)], capture_output=True, text=True,
+                             check=True).stdout.split()
+        times.append(float(out[0]))
+        modules = int(out[1])
+    return statistics.median(times), min(times), modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time importing the game in fresh interpreters")
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    print(f"{'scenario':<34} {'median ms':>10} {'min ms':>8} {'card modules':>13}")
+    for label, code in SCENARIOS.items():
+        median, fastest, modules = measure(code, args.runs)
+        print(f"{label:<34} {median * 1000:>10.1f} {fastest * 1000:>8.1f} {modules:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+How much memory a room takes once its game is set up.
+
+    python -m benchmarks.memory [--rooms 200] [--players 4]
+
+Sets up many games side by side, like a server with that many rooms, and reports the memory
+they hold on to per room, and per card, area and player in them.  Every card module is
+imported beforehand, so module and class memory isn't counted.
+"""
+import argparse
+import gc
+import io
+import tracemalloc
+from contextlib import redirect_stdout
+
+from bwc import cardreader
+from bwc.engine import Engine
+
+
+def make_room(players: int, seed: int) -> Engine:
+    engine = Engine()
+    engine.reset(None, None)
+    for seat in range(players):
+        engine.add_player(f'player{seat}')
+    engine.setup_game(seed=seed)
+    return engine
+
+
+def measure(rooms: int, players: int):
+    with redirect_stdout(io.StringIO()):
+        # Import every card module and build every proxy class before measuring
+        cardreader.make_deck()
+        make_room(players, 0)
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        engines = [make_room(players, seed) for seed in range(rooms)]
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+    game = engines[0].game
+    return (after - before) / rooms, len(game.all_cards), len(game.all_areas), len(game.players)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the memory a room takes")
+    parser.add_argument('--rooms', type=int, default=200)
+    parser.add_argument('--players', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    per_room, cards, areas, players = measure(args.rooms, args.players)
+    print(f"{args.rooms} rooms of {args.players} players: {per_room:,.0f} bytes per room")
+    print(f"({cards} cards, {areas} areas and {players} players per room, "
+          f"{per_room / (cards + areas + players):,.0f} bytes per object)")
+
+
+if __name__ == "__main__":
+    main()
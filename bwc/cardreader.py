@@ -1,38 +1,158 @@
+import heapq
+import importlib
 import inspect
+import json
+import pkgutil
 import random
+from os.path import join
+from types import MappingProxyType
+from typing import FrozenSet, List, Mapping, NamedTuple, Optional
 
-from bwc.objects import Card
-# We need this import here to "prime" the import later on into realizing our __all__ in
-# cards/__init__.py should actually be used to list the modules
-from bwc.cards import *
+from bwc.objects import Card, CardFlag
+from bwc.util import MODULE_ROOT
 
+# Lists every card, so the card modules only have to be imported once their cards are dealt.
+# Regenerate it with `python -m bwc.cardreader --write-manifest` after adding or changing a card
+MANIFEST_PATH = join(MODULE_ROOT, 'cards', 'manifest.json')
 
-def read_cards():
+
+class CardInfo(NamedTuple):
+    """
+    A card class, and what its cards look like before anything happens to them
+    """
+    class_name: str
+    module: str  # the module in bwc.cards that defines it
+    name: str
+    val: int
+    image: Optional[str]
+    tags: FrozenSet[str]
+    flags: FrozenSet[CardFlag]
+    hooks: FrozenSet[str]  # the handlers the card overrides, see Card.__init_subclass__
+
+    @property
+    def card_class(self) -> type:
+        """
+        The card class itself; its module is imported the first time this is needed
+        """
+        return getattr(importlib.import_module(f'bwc.cards.{self.module}'), self.class_name)
+
+    def to_json(self) -> dict:
+        return {
+            'class': self.class_name,
+            'module': self.module,
+            'name': self.name,
+            'val': self.val,
+            'image': self.image,
+            'tags': sorted(self.tags),
+            'flags': sorted(flag.name for flag in self.flags),
+            'hooks': sorted(self.hooks),
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'CardInfo':
+        return cls(data['class'], data['module'], data['name'], data['val'], data['image'], frozenset(data['tags']),
+                   frozenset(CardFlag[flag] for flag in data['flags']), frozenset(data['hooks']))
+
+
+def scan_cards() -> List[CardInfo]:
+    """
+    Import every module in bwc.cards and describe the cards they define.  Slow; the server
+    only needs this when there's no manifest.
+    """
     from bwc import cards
-    card_modules = inspect.getmembers(cards, inspect.ismodule)
-    card_classes = []
-    for card_module in card_modules:
-        card_classes.extend(inspect.getmembers(card_module[1], inspect.isclass))
-    card_classes = [card_class[1] for card_class in card_classes if card_class[1] != Card]
-    card_classes = [card_class for card_class in card_classes if Card in card_class.__bases__]
-    return card_classes
-
-
-def make_deck(size=0, shuffle=True):
-    classes = read_cards()
-    deck = []
-    for card_class in classes:
-        deck.append(card_class())
-    if shuffle:
-        random.shuffle(deck)  # nice
+    infos = []
+    for module_info in sorted(pkgutil.iter_modules(cards.__path__), key=lambda module_info: module_info.name):
+        card_module = importlib.import_module(f'bwc.cards.{module_info.name}')
+        for class_name, card_class in inspect.getmembers(card_module, inspect.isclass):
+            if card_class is Card or Card not in card_class.__bases__:
+                continue
+            card = card_class()
+            infos.append(CardInfo(class_name, module_info.name, card.name, card.val, card.image,
+                                  frozenset(card.tags), frozenset(card.flags), card_class._hooks))
+    return infos
+
+
+def write_manifest(path: str = MANIFEST_PATH):
+    with open(path, 'w') as f:
+        json.dump([info.to_json() for info in scan_cards()], f, indent=2)
+        f.write('\n')
+
+
+def _build_registry() -> Mapping[str, CardInfo]:
+    try:
+        with open(MANIFEST_PATH, 'r') as f:
+            infos = [CardInfo.from_json(data) for data in json.load(f)]
+    except FileNotFoundError:
+        infos = scan_cards()
+    return MappingProxyType({info.class_name: info for info in infos})
+
+
+# class name => CardInfo, for every card in bwc.cards; read once, when this module is imported
+CARDS: Mapping[str, CardInfo] = _build_registry()
+
+
+def read_cards():
+    return [info.card_class for info in CARDS.values()]
+
+
+def make_deck(size=0, shuffle=True, rng=None, weights: Mapping[str, float] = None, limits: Mapping[str, int] = None):
+    """
+    Deal a deck of cards.  Every card is dealt once before any card is dealt twice, and only
+    the cards that end up in the deck are built.
+
+    :param size: how many cards to deal; 0 deals one of every card
+    :param shuffle: shuffle the deck, otherwise cards come in registry order (for size=0)
+    :param rng: the random number generator to use, see Game.rng
+    :param weights: class name => how likely the card is to be dealt compared to others; 1 by
+    default, and 0 keeps the card out of the deck
+    :param limits: class name => most copies of the card in the deck; no limit by default
+    :return: the list of cards
+    """
+    if rng is None:
+        rng = random.Random()
+    if weights is None:
+        weights = {}
+    if limits is None:
+        limits = {}
+
+    pool = [(info, weights.get(name, 1)) for name, info in CARDS.items()
+            if weights.get(name, 1) > 0 and limits.get(name, 1) > 0]
     if size == 0:
-        return deck
-    while len(deck) < size:
-        deck.append(random.choice(classes)())
-    while len(deck) > size:
-        del deck[random.randint(0, len(deck) - 1)]
-    return deck
+        size = len(pool)
+
+    if size <= len(pool):
+        # Weighted sampling without replacement in one pass: every card gets the key
+        # u ** (1 / weight), and the cards with the largest keys are dealt.  Sorted by key,
+        # the dealt cards are already shuffled
+        keyed = ((rng.random() ** (1 / weight), index) for index, (info, weight) in enumerate(pool))
+        chosen = [index for key, index in heapq.nlargest(size, keyed)]
+        if not shuffle:
+            chosen.sort()
+        deck = [pool[index][0] for index in chosen]
+    else:
+        # One of every card, then weighted copies, as long as the card is under its limit
+        deck = [info for info, weight in pool]
+        copies = {info.class_name: 1 for info in deck}
+        while len(deck) < size:
+            pool = [(info, weight) for info, weight in pool
+                    if copies[info.class_name] < limits.get(info.class_name, size)]
+            if not pool:
+                raise ValueError(f"Can't deal {size} cards, the card limits only allow {len(deck)}")
+            for info in rng.choices([info for info, weight in pool], [weight for info, weight in pool],
+                                    k=size - len(deck)):
+                if copies[info.class_name] < limits.get(info.class_name, size):
+                    copies[info.class_name] += 1
+                    deck.append(info)
+        if shuffle:
+            rng.shuffle(deck)  # nice
+    return [info.card_class() for info in deck]
 
 
 if __name__ == "__main__":
-    print(read_cards())
+    import argparse
+    parser = argparse.ArgumentParser(description="List the cards")
+    parser.add_argument('--write-manifest', action='store_true', help=f"regenerate {MANIFEST_PATH}")
+    if parser.parse_args().write_manifest:
+        write_manifest()
+    else:
+        print(read_cards())
@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class FourMillionPoints(Card):
-    def init(self):
-        self.val = 6
-        self.name = '4 Million Points'
-        self.image = '4_Million_Points.png'
-        self.flags = set()
-        self.tags = set()
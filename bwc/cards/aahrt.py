@@ -1,5 +1,3 @@
-from random import choice
-
 from bwc.objects import Card
 
 
@@ -13,7 +11,7 @@ class aahrt(Card):
 
     def on_play(self, kernel, gamestate, player):
         kernel.send_message([self.owners[0]], f"[{self.name}] Yell a statement!")
-        asked_player = choice(list(gamestate.players.values()))
+        asked_player = kernel.rng.choice(list(gamestate.players.values()))
         kernel.send_message([asked_player], f"[{self.name}] Did {self.owners[0].username} find meaning in artwork?")
         kernel.get_player_input(asked_player, ["Nooooo!", "Yaaaaasssss!"], self.change_score)
 
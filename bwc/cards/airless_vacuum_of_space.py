@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class AirlessVacuumOfSpace(Card):
-    def init(self):
-        self.val = 0
-        self.name = 'Airless Vacuum of Space'
-        self.image = 'Airless_Vacuum_of_Space.png'
-        self.flags = set()
-        self.tags = set()
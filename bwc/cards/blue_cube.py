@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class blue_cube(Card):
-    def init(self):
-        self.val = 300
-        self.name = 'Blue Cube'
-        self.image = 'blue_cube.png'
-        self.flags = set()
-        self.tags = set()
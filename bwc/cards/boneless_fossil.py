@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class Boneless_Fossil(Card):
-    def init(self):
-        self.val = 100
-        self.name = 'Boneless Fossil'
-        self.image = 'Boneless_Fossil.png'
-        self.flags = set()
-        self.tags = set()
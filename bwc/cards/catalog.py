@@ -0,0 +1,47 @@
+"""
+Cards that are nothing but data: a name, a value, an image, flags and tags.  Instead of a
+module each, they are listed in catalog.json and compiled into classes when this module is
+first imported.  If a card's init() would only set those five fields, add it to the catalog.
+"""
+import json
+from os.path import join
+
+from bwc.objects import Card, CardFlag
+from bwc.util import MODULE_ROOT
+
+CATALOG_PATH = join(MODULE_ROOT, 'cards', 'catalog.json')
+
+
+def compile_card(entry: dict) -> type:
+    """
+    Build the Card class of a catalog entry.  The class declares no slots of its own, so its
+    cards are nothing but Card's slots, without a __dict__; and since it has no handlers the
+    kernel never sends it any events.
+
+    :param entry: the card's entry in catalog.json
+    :return: the new Card subclass
+    """
+    val = entry['val']
+    name = entry['name']
+    image = entry['image']
+    flags = frozenset(CardFlag[flag] for flag in entry['flags'])
+    tags = frozenset(entry['tags'])
+
+    def init(self):
+        self.val = val
+        self.name = name
+        self.image = image
+        self.flags = flags
+        self.tags = set(tags)
+
+    return type(entry['class'], (Card,), {
+        '__slots__': (),
+        '__module__': __name__,
+        '__qualname__': entry['class'],
+        'init': init,
+    })
+
+
+with open(CATALOG_PATH, 'r') as f:
+    for _entry in json.load(f):
+        globals()[_entry['class']] = compile_card(_entry)
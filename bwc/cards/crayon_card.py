@@ -1,5 +1,3 @@
-from random import choice
-
 from bwc.objects import Card
 
 
@@ -14,7 +12,7 @@ class crayon_card(Card):
     def on_play(self, kernel, gamestate, player):
         self.val = -300
         kernel.send_message([self.owners[0]], "[Crayon Card] Present your crayon!")
-        asked_player = choice(list(gamestate.players.values()))
+        asked_player = kernel.rng.choice(list(gamestate.players.values()))
         kernel.send_message([asked_player], f"[Crayon Card] Does {self.owners[0].username} have a crayon?")
         kernel.get_player_input(asked_player, ["no", "yes"], self.change_score)
 
@@ -1,5 +1,3 @@
-import random
-
 from bwc.objects import Card
 
 
@@ -15,5 +13,5 @@ class Dog_Ate_Your_Homework(Card):
         if (len(self.area.contents) > 1):  # If the area is empty, or only includes this card, break
             dupl = list(self.area.contents)
             dupl.remove(self)
-            rand_card = random.choice(dupl)
+            rand_card = kernel.rng.choice(dupl)
             kernel.move_card(self, rand_card, self.area, gamestate.discard)
@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class justified(Card):
-    def init(self):
-        self.val = -150
-        self.name = 'J u s t i f i e d'
-        self.image = 'Justified.png'
-        self.flags = set()
-        self.tags = set()
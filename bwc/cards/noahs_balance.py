@@ -1,4 +1,5 @@
 from bwc.objects import Card, CardFlag
+from bwc.server_rendering import format_player
 
 
 class NoahsBalance(Card):
@@ -10,16 +11,10 @@ class NoahsBalance(Card):
         self.tags = {"Lined"}
 
     def on_move(self, kernel, player, moving_card, from_area, to_area, gamestate):
-        player_counts = dict((name, 0) for name in gamestate.players)
-        for card in gamestate.all_cards:
-            if "Lined" in card.tags:
-                for owner in card.owners:
-                    player_counts[owner.username] += 1
-
         winning_players = []
-        for player_name, count in player_counts.items():
-            if gamestate.players[player_name] in self.owners and \
-                    count >= 7:
+        for player_name, owner in gamestate.players.items():
+            if owner in self.owners and \
+                    kernel.count_tagged("Lined", owner=owner) >= 7:
                 # Emulate "infinite" points
                 self.val = 1_000_000_000
                 winning_players.append(player_name)
@@ -1,5 +1,3 @@
-import random
-
 from bwc.objects import Card
 from bwc.server_rendering import format_area_id
 
@@ -16,9 +14,9 @@ class NoahsHair(Card):
     def on_play_move(self, kernel, player, moving_card, from_area, to_area, game):
         if moving_card == self and not self.active:
             self.active = True
-            do_random = random.randint(0, 1)
+            do_random = kernel.rng.randint(0, 1)
             if do_random:
-                random_area = random.choice(list(game.all_areas.values()))
+                random_area = kernel.rng.choice(list(game.all_areas.values()))
             else:
                 random_area = to_area
 
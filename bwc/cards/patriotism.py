@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class patriotism(Card):
-    def init(self):
-        self.val = 300
-        self.name = 'Patriotism'
-        self.image = 'Patriotism.png'
-        self.flags = set()
-        self.tags = set()
@@ -1,5 +1,3 @@
-import random
-
 from bwc.objects import Card
 
 
@@ -22,7 +20,7 @@ class positive_wormhole(Card):
         '''
         for player in self.owners:
             def closure(own):
-                to_move = random.choice(gamestate.all_cards)
+                to_move = kernel.rng.choice(gamestate.all_cards)
 
                 def callback(choice):
                     if choice == 'In your hand':
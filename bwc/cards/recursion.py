@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class Recursion(Card):
-    def init(self):
-        self.val = 200
-        self.name = 'Recursion'
-        self.image = 'Recursion.png'
-        self.flags = set()
-        self.tags = {"Technology"}
@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class StaplesBlankIndexCards(Card):
-    def init(self):
-        self.name = "Staples Blank Index Cards"
-        self.val = 500
-        self.image = "Staples_Blank_Index_Cards.png"
-        self.flags = set()
-        self.tags = set()
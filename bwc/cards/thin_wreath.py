@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class thin_wreath(Card):
-    def init(self):
-        self.val = -400
-        self.name = 'Thin Wreath'
-        self.image = 'ThinWreath.png'
-        self.flags = set()
-        self.tags = set()
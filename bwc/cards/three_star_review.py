@@ -1,5 +1,3 @@
-from random import choice
-
 from bwc.objects import Card
 
 
@@ -13,7 +11,7 @@ class Three_Star_Review(Card):
 
     def on_play(self, kernel, gamestate, player):
         kernel.send_message([self.owners[0]], "[3-Star Review] Go read a review!")
-        asked_player = choice(list(gamestate.players.values()))
+        asked_player = kernel.rng.choice(list(gamestate.players.values()))
         kernel.send_message([asked_player], f"[3-Star Review] What did {self.owners[0].username} read?")
         kernel.get_player_input(asked_player, ["No review", "3-star review", "0-star review"], self.change_score)
 
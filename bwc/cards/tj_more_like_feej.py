@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class tj_more_like_feej(Card):
-    def init(self):
-        self.val = -200
-        self.name = 'TJ? More Like Fee-J'
-        self.image = 'TJMoreLikeFeeJ.png'
-        self.flags = set()
-        self.tags = set()
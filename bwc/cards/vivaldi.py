@@ -1,10 +0,0 @@
-from bwc.objects import Card
-
-
-class vivaldi(Card):
-    def init(self):
-        self.val = -100
-        self.name = 'Vivaldi'
-        self.image = 'Vivaldi.png'
-        self.flags = set()
-        self.tags = {"Technology"}
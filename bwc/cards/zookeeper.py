@@ -10,9 +10,7 @@ class zookeeper(Card):
         self.tags = set()
 
     def on_play(self, kernel, gamestate, player):
-        for c in self.area.contents:
-            if "Animal" in c.tags:
-                self.val += 100
+        self.val += 100 * kernel.count_tagged("Animal", area=self.area)
 
     def on_move(self, kernel, player, card, from_area, to_area, gamestate):
         if card == self:
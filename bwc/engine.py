@@ -3,6 +3,7 @@ from os import listdir
 from bwc import cardreader
 from bwc.kernel import Kernel
 from bwc.objects import *
+from bwc.util import IdAllocator
 
 
 class Engine:
@@ -14,75 +15,76 @@ class Engine:
         self.game = Game()
         self.kernel = Kernel(self.game, send_message, get_player_input)
 
-    def setup_game(self, gamerounds=5, handsize=5):
+    def setup_game(self, gamerounds=5, handsize=5, seed=None):
+        # Seeding the game's rng makes the whole game repeatable, given the same moves
+        self.game.rng.seed(seed)
         self.setup_areas(gamerounds, handsize)
         self.game.turn_order = list(self.game.players.values())
         self.game.current_player = self.game.turn_order[self.game.turn_order_index]
 
     def setup_areas(self, gamerounds=5, handsize=5):
-        card_deck = cardreader.make_deck(len(self.game.players) * (handsize + gamerounds))
-        self.game.all_cards = card_deck[:]
+        card_deck = cardreader.make_deck(len(self.game.players) * (handsize + gamerounds), rng=self.game.rng)
+        self.game.all_cards = CardOrder(card_deck)
 
         # discard
-        discard = Area()
-        discard.id = "discard"
+        discard = Area(area_id="discard")
         discard.flags = {AreaFlag.DISCARD_AREA}
         self.game.discard = discard
         self.game.all_areas[discard.id] = discard
 
         # center
-        center = Area()
+        center = Area(area_id="center")
         center.owners = list(self.game.players.values())
         center.viewers = list(self.game.players.values())
-        center.id = "center"
         center.flags = {AreaFlag.PLAY_AREA}
         self.game.center = center
         self.game.all_areas[center.id] = center
 
         # players' play areas
         for player in self.game.players.values():
-            area = Area()
+            area = Area(area_id=f'{player.username}.play')
             area.owners = [player]
             area.viewers = list(self.game.players.values())
-            area.id = f'{player.username}.play'
             area.flags = {AreaFlag.PLAY_AREA}
             player.area = area
             self.game.all_areas[area.id] = area
 
         # players' hands
         for player in self.game.players.values():
-            hand = Area()
+            hand = Area(area_id=f'{player.username}.hand')
             hand.owners = [player]
             hand.viewers = [player]
             player.hand = hand
             hand.flags = {AreaFlag.HAND_AREA}
-            hand.id = f'{player.username}.hand'
             hand.contents = card_deck[:handsize]
             for card in hand.contents:
                 card._area = hand
-                card._owner = player
+                card._owners = hand.owners
             card_deck = card_deck[handsize:]
             self.game.all_areas[hand.id] = hand
 
         # draw pile
-        draw = Area()
+        draw = Area(area_id="drawpile")
         draw.contents = card_deck
         for card in draw.contents:
             card._area = draw
-        draw.id = "drawpile"
         draw.flags = {AreaFlag.DRAW_AREA}
         self.game.draw = draw
         self.game.all_areas[draw.id] = draw
 
+        self.game.area_ids = IdAllocator(list(self.game.players) + list(self.game.all_areas), self.game.rng)
+
         # D E B U G M O D E
         if 'DEBUG' in listdir('..'):
-            extra_cards = cardreader.make_deck(shuffle=False)
-            self.game.all_cards += extra_cards
+            extra_cards = cardreader.make_deck(shuffle=False, rng=self.game.rng)
+            self.game.all_cards.extend(extra_cards)
             player = list(self.game.players.values())[0]
             player.hand.contents += extra_cards
             for card in player.hand.contents:
                 card._area = player.hand
-                card._owner = player
+                card._owners = player.hand.owners
+
+        self.kernel.index_cards()
 
     def add_player(self, username):
         if self.game is None:
@@ -1,9 +1,32 @@
 import asyncio
 import traceback
-from typing import Callable, Tuple, Union
+from random import Random
+from time import perf_counter
+from typing import Callable, FrozenSet, Tuple, Union
 
 from bwc.objects import *
-from bwc.util import immutablize
+from bwc.util import ViewCache
+
+# Handlers that only observe the game; calling them doesn't invalidate cached scores, unless
+# the handler changed its own card, see _card_state
+READ_ONLY_HOOKS = frozenset({'handle_look', 'on_look', 'handle_score_area', 'on_score_area', 'handle_score_card',
+                             'on_score_card', 'handle_score_player', 'on_score_player', 'handle_winner'})
+
+
+def _card_face(card: Card) -> tuple:
+    """
+    What players see of a card when they look at its area, see Kernel.area_version
+    """
+    return card.name, card.image
+
+
+def _card_state(card: Card) -> tuple:
+    """
+    What a read-only handler might change about its own card: its fields, flags and tags, and
+    the attributes the card's class added.  Attributes that are changed in place (like adding
+    to a set) don't show up here
+    """
+    return card.val, card.name, card.image, card._flags.bits, set(card.tags), dict(getattr(card, '__dict__', ()))
 
 
 class Kernel:
@@ -15,20 +38,261 @@ class Kernel:
         self.__send_message_async = send_message_callback
         self.__get_player_input_async = get_player_input_callback
 
+        # The cards that currently receive events, kept in the same priority order as
+        # game.all_cards so that dispatching never has to look at the draw pile or hands
+        self.__active_cards = CardOrder()
+        # (handler depth, card) for the cards handed out by get_mutable_card whose changes haven't
+        # been looked at yet.  Each is re-checked once, when the handler that asked for it returns
+        self.__mutable_cards: List[Tuple[int, Card]] = []
+        # How many card handlers are running right now, one inside the other, and how many of
+        # those aren't in READ_ONLY_HOOKS.  Those may have changed the game without telling the
+        # kernel yet, so scores aren't cached while they run
+        self.__handler_depth = 0
+        self.__writing_handlers = 0
+
+        # Read-only views of game objects handed to cards, shared by every handler until the
+        # kernel next changes the game.  Only the objects that stay in the game are worth it
+        self.__views = ViewCache((Card, Area, Player, Game, CardOrder, AreaContents))
+
+        # Tag => card uuid => card, for every card in the game; area uuid => tag => how many
+        # cards in the area have it; and card uuid => the tags and area uuid the card is
+        # counted under.  Lets cards count tagged cards without looking at every card
+        self.__tagged: Dict[str, Dict[int, Card]] = {}
+        self.__area_tags: Dict[int, Dict[str, int]] = {}
+        self.__indexed_tags: Dict[int, Tuple[FrozenSet[str], Optional[int]]] = {}
+
+        # Bumped every time the game may have changed; scores are cached per version
+        self.__version = 0
+        # Area uuid => the version at which the area's contents last changed, see area_version
+        self.__area_versions: Dict[int, int] = {}
+        self.__score_cache = {}
+        # Set while scoring when a volatile card took part, so the result isn't cached
+        self.__score_volatile = False
+
+        # (card class name, handler name) => [calls, seconds]; None unless someone asked for hook timings
+        self.__hook_timings = None
+        self.index_cards()
+
+    @property
+    def rng(self) -> Random:
+        """
+        The game's random number generator.  Cards make their random choices with it, so that
+        a game seeded through Engine.setup_game plays out the same way every time.
+        """
+        return self.__game.rng
+
+    @property
+    def version(self) -> int:
+        """
+        The version of the game state.  It changes every time the kernel changes the game
+        or lets a card change it, so anything derived from the game can be cached against it.
+        """
+        return self.__version
+
+    def area_version(self, area: Area) -> int:
+        """
+        The version of an area's contents.  It changes whenever cards enter or leave the area,
+        a card in it is handed out by get_mutable_card, or a card in it renames itself (or
+        changes its image) in one of its handlers, so whatever shows the area only needs to
+        be redone when this changes.
+
+        :param area: the area
+        :return: the version of its contents; never goes down
+        """
+        return self.__area_versions.get(self.__mutablize_obj(area)._uuid, 0)
+
+    def __touch_areas(self, *areas: Area):
+        """
+        Record that cards entered or left some areas, see area_version.  Call after __invalidate
+        """
+        for area in areas:
+            self.__area_versions[area._uuid] = self.__version
+
+    def __invalidate(self, views=True):
+        """
+        Record that the game may have changed, dropping every cached score
+
+        :param views: whether to also drop the cached read-only views.  Views never go stale,
+        so this is only needed once objects may have been replaced or left the game
+        """
+        self.__version += 1
+        if self.__score_cache:
+            self.__score_cache = {}
+        if views:
+            self.__views.clear()
+
+    def __after_handler(self, card: Card, read_only: bool, before: tuple):
+        """
+        Bookkeeping after a card's handler ran: the handler may have changed the card (or a
+        mutable card it was handed), and a volatile card makes the current score uncacheable
+
+        :param read_only: whether the handler is in READ_ONLY_HOOKS
+        :param before: the card's _card_state from before the handler ran if it is read-only,
+        its _card_face otherwise
+        """
+        settled = self.__mutable_cards and self.__settle_mutable_cards(self.__handler_depth)
+        if read_only:
+            changed = _card_state(card) != before
+            face = before[1:3]
+        else:
+            changed, face = True, before
+        if changed and not settled:
+            self.__invalidate(views=False)
+        if changed and card._area is not None and _card_face(card) != face:
+            # The card looks different now, so its area does too
+            self.__touch_areas(card._area)
+        if card._flags.bits & VOLATILE_SCORE:
+            self.__score_volatile = True
+        # Cards may change their own tags
+        self.__index_tags(card)
+
+    def time_hooks(self, timings: Optional[Dict[Tuple[str, str], List]] = None):
+        """
+        Start recording how long the cards' handlers take, or stop recording if timings is None.
+        Timing is off by default, so normal games don't pay for it.
+
+        :param timings: maps (card class name, handler name) to [number of calls, total seconds],
+        entries are added and updated in place.  The time of a handler includes anything it
+        made the kernel do, including other cards' handlers
+        """
+        self.__hook_timings = timings
+
+    def __record_hook_time(self, card: Card, handler_str: str, elapsed: float):
+        key = (type(card).__name__, handler_str)
+        entry = self.__hook_timings.get(key)
+        if entry is None:
+            self.__hook_timings[key] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def index_cards(self):
+        """
+        Rebuild the kernel's view of which cards receive events from scratch.
+        Call this after the game's cards were set up without going through the kernel.
+        """
+        self.__active_cards = CardOrder(card for card in self.__game.all_cards if self.__is_active(card))
+        self.__tagged = {}
+        self.__area_tags = {}
+        self.__indexed_tags = {}
+        for card in self.__game.all_cards:
+            self.__index_tags(card)
+        self.__invalidate()
+        self.__touch_areas(*self.__game.all_areas.values())
+
+    def __index_tags(self, card: Card):
+        """
+        Bring the tag indexes up to date with a card's tags and area.  Cheap when neither
+        changed, so it can be called after anything that might have changed them.
+
+        :param card: the card to (re)index
+        """
+        area_uuid = None if card._area is None else card._area._uuid
+        indexed = self.__indexed_tags.get(card._uuid)
+        if indexed is not None:
+            tags, indexed_area_uuid = indexed
+            if indexed_area_uuid == area_uuid and card.tags == tags:
+                return
+            area_tags = self.__area_tags.get(indexed_area_uuid)
+            for tag in tags:
+                del self.__tagged[tag][card._uuid]
+                if area_tags is not None:
+                    area_tags[tag] -= 1
+
+        tags = frozenset(card.tags)
+        self.__indexed_tags[card._uuid] = (tags, area_uuid)
+        area_tags = None if area_uuid is None else self.__area_tags.setdefault(area_uuid, {})
+        for tag in tags:
+            self.__tagged.setdefault(tag, {})[card._uuid] = card
+            if area_tags is not None:
+                area_tags[tag] = area_tags.get(tag, 0) + 1
+
     def __update_card_in_game(self, card: Card):
         """
         When a card is played, it gets bumped to the highest callback priority,
-        this attempts to move said card in the game's all_cards list.  Cards
-        near the front of the list have their handlers called first
+        this attempts to move said card in the game's all_cards order.  Cards
+        near the front of the order have their handlers called first
 
         :param card: the card to be update
         """
-        try:
-            index = self.__game.all_cards.index(card)
-        except ValueError:
+        if card in self.__game.all_cards:
+            self.__game.all_cards.bump(card)
+
+    def __is_active(self, card: Card) -> bool:
+        """
+        Whether a card should currently receive events: it has handlers, and it either sits
+        in a play area or asked to always get them.  Cards without any handlers (like the
+        catalog cards) are never active, so the kernel doesn't even keep track of them
+
+        :param card: the card to check
+        :return: True if the card's handlers should be called
+        """
+        if not card._hooks:
+            return False
+        return (card._area is not None and card._area._flags.bits & PLAY_AREA != 0) or \
+            card._flags.bits & ALWAYS_GET_EVENTS != 0
+
+    def __bump_active_card(self, card: Card):
+        """
+        Update the active cards after a card was bumped to the front of game.all_cards
+
+        :param card: the card that was bumped
+        """
+        if self.__is_active(card):
+            self.__active_cards.bump(card)
+        else:
+            self.__active_cards.discard(card)
+
+    def __refresh_active_card(self, card: Card):
+        """
+        Re-check whether a card should receive events, for when its flags changed without it
+        being bumped
+
+        :param card: the card to re-check
+        """
+        active = self.__is_active(card)
+        if active == (card in self.__active_cards):
             return
+        if active:
+            self.__active_cards.place(card, self.__game.all_cards)
+        else:
+            self.__active_cards.discard(card)
 
-        self.__game.all_cards = [card] + self.__game.all_cards[:index] + self.__game.all_cards[index + 1:]
+    def __settle_mutable_cards(self, depth: int) -> bool:
+        """
+        Catch up with the changes made to the cards handed out by get_mutable_card to handlers
+        deeper than depth, which have all returned, and forget about those cards.  This counts
+        as a change to the game, and to the areas those cards are in
+
+        :param depth: the handler depth the kernel is back at, -1 outside of any handler
+        :return: whether there were any such cards
+        """
+        settled = False
+        while self.__mutable_cards and self.__mutable_cards[-1][0] > depth:
+            card = self.__mutable_cards.pop()[1]
+            if not settled:
+                self.__invalidate(views=False)
+                settled = True
+            self.__refresh_active_card(card)
+            self.__index_tags(card)
+            if card._area is not None:
+                self.__touch_areas(card._area)
+        return settled
+
+    def __subscribers(self, handler_str: str):
+        """
+        Find the cards that should be polled for a handler, in callback priority order.
+        Only active cards are considered, and cards whose class doesn't override the
+        handler are skipped without ever calling into them, see Card.__init_subclass__
+
+        :param handler_str: the name of the handler
+        :return: a list of the cards subscribed to that handler
+        """
+        if self.__mutable_cards and not self.__handler_depth:
+            # Cards handed out by get_mutable_card outside of any handler
+            self.__settle_mutable_cards(-1)
+        return [card for card in self.__active_cards
+                if handler_str in card._hooks and self.__is_active(card)]
 
     def __run_card_handler(self, card: Card, handler_str: str, *args):
         """
@@ -41,20 +305,33 @@ class Kernel:
         :param *args: all remaining args will be passed to the handler
         :return: the return value from the handler call
         """
-        immutable_args = [immutablize(arg) for arg in args]
-        if AreaFlag.PLAY_AREA in card._area.flags or CardFlag.ALWAYS_GET_EVENTS in card.flags:
-            handler = getattr(card, handler_str, None)
-            result = None
-            try:
-                result = handler(self, *immutable_args)
-            except AttributeError as e:
-                # TODO: do something with the error, like alert the
-                # players a card has crashed
-                traceback.print_exc()
-            return result
-        else:
+        if handler_str not in card._hooks or not self.__is_active(card):
             return None
 
+        immutable_args = [self.__views.view(arg) for arg in args]
+        handler = getattr(card, handler_str, None)
+        result = None
+        read_only = handler_str in READ_ONLY_HOOKS
+        before = _card_state(card) if read_only else _card_face(card)
+        timed = self.__hook_timings is not None
+        if timed:
+            start = perf_counter()
+        self.__handler_depth += 1
+        self.__writing_handlers += not read_only
+        try:
+            result = handler(self, *immutable_args)
+        except AttributeError as e:
+            # TODO: do something with the error, like alert the
+            # players a card has crashed
+            traceback.print_exc()
+        finally:
+            self.__handler_depth -= 1
+            self.__writing_handlers -= not read_only
+        if timed:
+            self.__record_hook_time(card, handler_str, perf_counter() - start)
+        self.__after_handler(card, read_only, before)
+        return result
+
     def __run_all_hooks(self, hook_str: str, *args):
         """
         Run the function on every card
@@ -65,15 +342,31 @@ class Kernel:
         :param *args: the args to be passed to the function
         :return:
         """
-        immutable_args = [immutablize(arg) for arg in args]
-        for card in self.__game.all_cards:
-            if AreaFlag.PLAY_AREA in card._area.flags or CardFlag.ALWAYS_GET_EVENTS in card.flags:
-                handler = getattr(card, hook_str, None)
-                try:
-                    handler(self, *immutable_args)
-                except Exception:
-                    traceback.print_exc()
-                    pass
+        subscribers = self.__subscribers(hook_str)
+        if not subscribers:
+            return
+
+        immutable_args = [self.__views.view(arg) for arg in args]
+        read_only = hook_str in READ_ONLY_HOOKS
+        timed = self.__hook_timings is not None
+        for card in subscribers:
+            handler = getattr(card, hook_str, None)
+            before = _card_state(card) if read_only else _card_face(card)
+            if timed:
+                start = perf_counter()
+            self.__handler_depth += 1
+            self.__writing_handlers += not read_only
+            try:
+                handler(self, *immutable_args)
+            except Exception:
+                traceback.print_exc()
+                pass
+            finally:
+                self.__handler_depth -= 1
+                self.__writing_handlers -= not read_only
+            if timed:
+                self.__record_hook_time(card, hook_str, perf_counter() - start)
+            self.__after_handler(card, read_only, before)
 
     def __mutablize_obj(self, obj):
         return getattr(obj, "_backing_obj", obj)
@@ -93,7 +386,7 @@ class Kernel:
 
         can_look = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_look'):
             can_look = self.__run_card_handler(card, "handle_look", player, play_area, self.__game)
             if can_look is not None:
                 break
@@ -111,16 +404,16 @@ class Kernel:
         """
         Default test if looking at an area is allowed
         """
-        if AreaFlag.PLAY_AREA in play_area.flags:
+        if play_area._flags.bits & PLAY_AREA:
             return True
 
-        if AreaFlag.HAND_AREA in play_area.flags:
+        if play_area._flags.bits & HAND_AREA:
             return player in play_area.viewers
 
-        if AreaFlag.DISCARD_AREA in play_area.flags:
+        if play_area._flags.bits & DISCARD_AREA:
             return False
 
-        if AreaFlag.DRAW_AREA in play_area.flags:
+        if play_area._flags.bits & DRAW_AREA:
             return False
 
         return True
@@ -185,7 +478,7 @@ class Kernel:
             return False
 
         can_move = None
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_move'):
             can_move = self.__run_card_handler(card, "handle_move", player, moving_card, from_area, to_area, self.__game)
             if can_move is not None:
                 break
@@ -199,41 +492,44 @@ class Kernel:
             # DISCARD action
             # we call this before the card is moved to the discard pile
             # because once it's discarded it's technically out of play
-            if AreaFlag.DISCARD_AREA in to_area.flags and \
-                    AreaFlag.DISCARD_AREA not in from_area.flags:
+            if to_area._flags.bits & DISCARD_AREA and \
+                    not from_area._flags.bits & DISCARD_AREA:
                 self.__run_card_handler(moving_card, 'on_discard', self.__game, player)
 
             # execute action
-            index = from_area.contents.index(moving_card)
-            from_area.contents = from_area.contents[:index] + from_area.contents[index + 1:]
-            to_area.contents = [moving_card] + to_area.contents
+            from_area.contents.remove(moving_card)
+            to_area.contents.push_front(moving_card)
             moving_card._owners = to_area.owners
             moving_card._area = to_area
+            self.__index_tags(moving_card)
+            self.__invalidate()
+            self.__touch_areas(from_area, to_area)
 
             self.__update_card_in_game(moving_card)
+            self.__bump_active_card(moving_card)
             self.__run_all_hooks('on_move', player, moving_card, from_area, to_area, self.__game)
 
             # update data
 
             # Current player is playing
-            if AreaFlag.HAND_AREA in from_area.flags and \
-                    AreaFlag.PLAY_AREA in to_area.flags and \
+            if from_area._flags.bits & HAND_AREA and \
+                    to_area._flags.bits & PLAY_AREA and \
                     player in from_area.owners and \
                     player == self.__game.current_player and \
-                    CardFlag.PLAY_ANY_TIME not in moving_card.flags and \
+                    not moving_card._flags.bits & PLAY_ANY_TIME and \
                     default_handled and not card_initiated:
                 self.__game.cards_played_this_turn += 1
 
             # PLAY action
-            if AreaFlag.PLAY_AREA not in from_area.flags and \
-                    AreaFlag.PLAY_AREA in to_area.flags:
+            if not from_area._flags.bits & PLAY_AREA and \
+                    to_area._flags.bits & PLAY_AREA:
                 self.__run_card_handler(moving_card, 'on_play', self.__game, player)
                 moving_card._player = player
                 self.__run_all_hooks('on_play_move', player, moving_card, from_area, to_area, self.__game)
 
             # DRAW action
-            if AreaFlag.DRAW_AREA in from_area.flags and \
-                    AreaFlag.HAND_AREA in to_area.flags and \
+            if from_area._flags.bits & DRAW_AREA and \
+                    to_area._flags.bits & HAND_AREA and \
                     player in to_area.owners and \
                     player == self.__game.current_player and \
                     default_handled and not card_initiated:
@@ -257,11 +553,11 @@ class Kernel:
         """
         # card's moves are allowed by default
         if isinstance(requestor, Card):
-            if CardFlag.NO_PLAY_TO_CENTER in card.flags and \
+            if card._flags.bits & NO_PLAY_TO_CENTER and \
                     to_area == self.__game.center:
                 return False
-            if CardFlag.ONLY_PLAY_TO_CENTER in card.flags and \
-                    AreaFlag.PLAY_AREA in to_area.flags and \
+            if card._flags.bits & ONLY_PLAY_TO_CENTER and \
+                    to_area._flags.bits & PLAY_AREA and \
                     to_area != self.__game.center:
                 return False
             return True
@@ -269,22 +565,22 @@ class Kernel:
         player = requestor
 
         # player's moves are thoroughly examined
-        if AreaFlag.HAND_AREA in from_area.flags and \
-                AreaFlag.PLAY_AREA in to_area.flags and \
+        if from_area._flags.bits & HAND_AREA and \
+                to_area._flags.bits & PLAY_AREA and \
                 player in from_area.owners:
-            if CardFlag.ONLY_PLAY_TO_SELF in card.flags and \
+            if card._flags.bits & ONLY_PLAY_TO_SELF and \
                     to_area != player.area:
                 return False
-            if CardFlag.NO_PLAY_TO_SELF in card.flags and \
+            if card._flags.bits & NO_PLAY_TO_SELF and \
                     to_area == player.area:
                 return False
-            if CardFlag.ONLY_PLAY_TO_CENTER in card.flags and \
+            if card._flags.bits & ONLY_PLAY_TO_CENTER and \
                     to_area != self.__game.center:
                 return False
-            if CardFlag.NO_PLAY_TO_CENTER in card.flags and \
+            if card._flags.bits & NO_PLAY_TO_CENTER and \
                     to_area == self.__game.center:
                 return False
-            if CardFlag.PLAY_ANY_TIME in card.flags:
+            if card._flags.bits & PLAY_ANY_TIME:
                 return True
             elif player == self.__game.current_player and \
                     self.__game.cards_played_this_turn < \
@@ -295,8 +591,8 @@ class Kernel:
                     self.__game.max_cards_played_this_turn:
                 return True
 
-        if AreaFlag.DRAW_AREA in from_area.flags and \
-                AreaFlag.HAND_AREA in to_area.flags and \
+        if from_area._flags.bits & DRAW_AREA and \
+                to_area._flags.bits & HAND_AREA and \
                 player in to_area.owners:
             if player == self.__game.current_player and \
                     (self.__game.cards_drawn_this_turn <
@@ -323,7 +619,7 @@ class Kernel:
 
         can_end_turn = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_end_turn'):
             can_end_turn = self.__run_card_handler(card, "handle_end_turn", player, self.__game)
             if can_end_turn is not None:
                 break
@@ -355,22 +651,61 @@ class Kernel:
 
         return False
 
+    def __cached_score(self, key, compute, *args):
+        """
+        Look a score up in the cache for the current version, computing and caching it if
+        it isn't there.  Scores that involved a volatile card are never cached, and neither
+        are scores asked for while a handler that may change the game is running: it may
+        already have changed its own card without the kernel knowing.
+
+        :param key: identifies the scored object
+        :param compute: computes the score from *args
+        :return: the score
+        """
+        if self.__writing_handlers:
+            return compute(*args)
+        score = self.__score_cache.get(key)
+        if score is not None:
+            return score
+
+        version = self.__version
+        outer_volatile = self.__score_volatile
+        self.__score_volatile = False
+        try:
+            score = compute(*args)
+        finally:
+            volatile = self.__score_volatile
+            self.__score_volatile = outer_volatile or volatile
+
+        if not volatile and version == self.__version:
+            self.__score_cache[key] = score
+        return score
+
     def score_area(self, score_area: Area):
         """
         Gets the score of an area
         polls the cards to see if a custom scoring operation is needed
         if no cards return a score, calls __default_score_area_handler
+        Scores are cached until the game changes, but the on_score_area hooks run
+        every time
 
         :param score_area: the area to score
         :return: the score
         """
 
         score_area = self.__mutablize_obj(score_area)
+        score = self.__cached_score(('area', score_area), self.__score_area, score_area)
+        self.__run_all_hooks('on_score_area', score_area, score, self.__game)
+        return score
 
+    def __score_area(self, score_area: Area, card_scores: Optional[Dict[Card, int]] = None):
         score = None
-        default_score = sum(self.score_card(card) for card in score_area.contents)
+        if card_scores is None:
+            default_score = sum(self.score_card(card) for card in score_area.contents)
+        else:
+            default_score = sum(card_scores[card] for card in score_area.contents)
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_score_area'):
             score = self.__run_card_handler(card, 'handle_score_area', score_area, default_score, self.__game)
 
             if score is not None:
@@ -379,7 +714,6 @@ class Kernel:
         if score is None:
             score = default_score
 
-        self.__run_all_hooks('on_score_area', score_area, score, self.__game)
         return score
 
     def score_card(self, score_card: Card):
@@ -387,16 +721,25 @@ class Kernel:
         Gets the score of a card.
         Polls the cards to see if a custom score value should be returned.
         If no cards return a custom score, calls __default_score_card_handler.
+        Scores are cached until the game changes, unless the card is flagged
+        CardFlag.VOLATILE_SCORE, but the on_score_card hooks run every time
 
         :param score_card: - the card to score
         :return: the score
         """
 
         score_card = self.__mutablize_obj(score_card)
+        score = self.__cached_score(('card', score_card), self.__score_card, score_card)
+        self.__run_all_hooks('on_score_card', score_card, self.__game)
+        return score
+
+    def __score_card(self, score_card: Card):
+        if score_card._flags.bits & VOLATILE_SCORE:
+            self.__score_volatile = True
 
         score = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_score_card'):
             score = self.__run_card_handler(card, 'handle_score_card', score_card, self.__game)
             if score is not None:
                 break
@@ -405,8 +748,6 @@ class Kernel:
             # Default is just the defined value
             score = score_card.val
 
-        self.__run_all_hooks('on_score_card', score_card, self.__game)
-
         return score
 
     def score_player(self, player: Player):
@@ -414,31 +755,121 @@ class Kernel:
         Gets a player's score
         By defualt sums all the PLAY_AREAs the player owns
         Polls cards for a custom score
+        Scores are cached until the game changes, but the on_score_player hooks run
+        every time
 
         :param player: the player whose score is calculated
         :return: the score
         """
         player = self.__mutablize_obj(player)
+        score = self.__cached_score(('player', player), self.__score_player, player)
+        self.__run_all_hooks('on_score_player', player, score, self.__game)
+        return score
 
+    def __score_player(self, player: Player, area_scores: Optional[Dict[Area, int]] = None):
         score = 0
         for area in self.__game.all_areas.values():
-            if AreaFlag.PLAY_AREA in area.flags and player in area.owners:
-                score += self.score_area(area)
+            if area._flags.bits & PLAY_AREA and player in area.owners:
+                score += self.score_area(area) if area_scores is None else area_scores[area]
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_score_player'):
             score_delta = self.__run_card_handler(card, 'handle_score_player', player, score, self.__game)
             if score_delta is not None:
                 score += score_delta
 
-        self.__run_all_hooks('on_score_player', player, score, self.__game)
-
         return score
 
+    def score_all(self) -> Scoreboard:
+        """
+        Scores every card and area in play, and every player, in a single pass.  Each score
+        is computed (and its on_score_* hooks run) only once, and the whole scoreboard is
+        cached until the game changes, so rendering and end-of-game code can share it.
+
+        :return: the Scoreboard for the current state of the game
+        """
+        return self.__cached_score(('scoreboard',), self.__score_all)
+
+    def __score_all(self) -> Scoreboard:
+        # Areas and players are scored from the scores already on the scoreboard, so every
+        # on_score_* hook runs once per score
+        scoreboard = Scoreboard(self.__version)
+        for area in self.__game.all_areas.values():
+            if area._flags.bits & PLAY_AREA:
+                for card in area.contents:
+                    scoreboard.cards[card] = self.score_card(card)
+                score = self.__cached_score(('area', area), self.__score_area, area, scoreboard.cards)
+                self.__run_all_hooks('on_score_area', area, score, self.__game)
+                scoreboard.areas[area] = score
+
+        for player in self.__game.players.values():
+            score = self.__cached_score(('player', player), self.__score_player, player, scoreboard.areas)
+            self.__run_all_hooks('on_score_player', player, score, self.__game)
+            scoreboard.players[player] = score
+
+        return scoreboard
+
+    def __tagged_areas(self, owner: Optional[Player], area: Optional[Area]) -> List[Area]:
+        """
+        The areas count_tagged and tagged_cards look in
+        """
+        if self.__mutable_cards:
+            if not self.__handler_depth:
+                # Cards handed out by get_mutable_card outside of any handler
+                self.__settle_mutable_cards(-1)
+            else:
+                # Only the cards handed to the handlers still running, which may be asking
+                # about the tags they just changed
+                for _, card in self.__mutable_cards:
+                    self.__index_tags(card)
+        if area is not None:
+            areas = [self.__mutablize_obj(area)]
+        else:
+            areas = list(self.__game.all_areas.values())
+        if owner is not None:
+            owner = self.__mutablize_obj(owner)
+            areas = [area for area in areas if owner in area.owners]
+        return areas
+
+    def count_tagged(self, tag: str, owner: Optional[Player] = None, area: Optional[Area] = None) -> int:
+        """
+        Counts the cards in the game that have a tag.  The kernel keeps count of the tags in
+        every area as cards move, so this never looks at the cards themselves
+
+        :param tag: the tag to look for, like "Animal"
+        :param owner: only count the cards in areas this player owns
+        :param area: only count the cards in this area
+        :return: the number of cards
+        """
+        if owner is None and area is None:
+            self.__tagged_areas(None, None)
+            return len(self.__tagged.get(tag, ()))
+        return sum(self.__area_tags.get(area._uuid, {}).get(tag, 0) for area in self.__tagged_areas(owner, area))
+
+    def tagged_cards(self, tag: str, owner: Optional[Player] = None, area: Optional[Area] = None) -> List[Card]:
+        """
+        Finds the cards in the game that have a tag, without looking at every card
+
+        :param tag: the tag to look for, like "Animal"
+        :param owner: only include the cards in areas this player owns
+        :param area: only include the cards in this area
+        :return: the cards, in no particular order
+        """
+        if owner is None and area is None:
+            self.__tagged_areas(None, None)
+            cards = self.__tagged.get(tag, {}).values()
+        else:
+            area_uuids = {area._uuid for area in self.__tagged_areas(owner, area)}
+            cards = [card for card in self.__tagged.get(tag, {}).values()
+                     if card._area is not None and card._area._uuid in area_uuids]
+        return [self.__views.view(card) for card in cards]
+
     def get_mutable_card(self, requestor: Card, requested_card: Card):
         """
         Returns a mutable copy of a card
         polls the cards to see if the requestor is allowed to edit the requested card
         if no cards return a True or False, calls __default_score_card_handler
+        The kernel catches up with changes to the card once the requestor's handler returns,
+        so change it right away rather than keeping it to change later
 
         :param requestor: the card doing the card request
         :param requested_card: the card the requestor wants a mutable version of
@@ -450,7 +881,7 @@ class Kernel:
 
         is_allowed = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_get_mutable_card'):
             is_allowed = self.__run_card_handler(card, 'handle_get_mutable_card',
                                                  requestor, requested_card, self.__game)
             if is_allowed is not None:
@@ -461,12 +892,19 @@ class Kernel:
             is_allowed = True
 
         if is_allowed:  # requested_card has been unimmutablized
+            # The requestor is about to change the card, so whatever we cached is suspect
+            self.__invalidate(views=False)
+            if requested_card._area is not None:
+                # ... including how its area looks
+                self.__touch_areas(requested_card._area)
             self.__run_all_hooks('on_get_mutable_card', requestor, requested_card, self.__game)
+            # Only now, so the hooks above don't look at the card before the requestor changed it
+            self.__mutable_cards.append((self.__handler_depth, requested_card))
             return requested_card
 
         return None
 
-    def end_game(self, requestor: Union[Card, None]):
+    def end_game(self, requestor: Union[Card, None] = None):
         """
         Ends the game.
 
@@ -481,7 +919,7 @@ class Kernel:
             requestor = self.__mutablize_obj(requestor)
 
         is_allowed = None
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_end_game'):
             is_allowed = self.__run_card_handler(card, 'handle_end_game', requestor,
                                                  self.__game)
             if is_allowed is not None:
@@ -493,7 +931,8 @@ class Kernel:
 
         if is_allowed:
             self.__game.is_over = True
-            self.run_all_hooks('on_end_game', self.__game)
+            self.__invalidate(views=False)
+            self.__run_all_hooks('on_end_game', self.__game)
 
         return is_allowed
 
@@ -519,40 +958,41 @@ class Kernel:
         :param choices: the list of choices the player can choose from
         :param callback: a function that will be called when the player makes their choice
         """
+        def invalidating_callback(choice: str):
+            # Cards usually change their own state once the player has chosen
+            try:
+                callback(choice)
+            finally:
+                self.__invalidate(views=False)
+
         if self.__get_player_input_async is not None:
-            asyncio.create_task(self.__get_player_input_async(player, choices, callback))
+            asyncio.create_task(self.__get_player_input_async(player, choices, invalidating_callback))
         else:
             print("Warning: kernel can't get_player_input!")
 
     def create_new_area(self, requestor: Card, new_area: Area):
         """
         Add a new area to the game, if poll allows
+        The area keeps new_area's id, with a number appended if that id is already in use
 
         :param requestor: the card that initiated this action
         :param new_area: the area to create
         :return: the new area if allowed, or None
         """
         requestor = self.__mutablize_obj(requestor)
-        area = Area()  # disallow list for ids: [p.username for p in self.__game.players] + [a.id for a in self.__game.all_areas]
+        # Keep the requested id, with a number added if it's already in use
+        area = Area(area_id=self.__game.area_ids.unique(self.__mutablize_obj(new_area.id)))
         for owner in new_area.owners:
             area.owners.append(self.__game.players[owner.username])
         for viewer in new_area.viewers:
             area.viewers.append(self.__game.players[viewer.username])
         for content in new_area.contents:
             area.contents.append(self.__mutablize_obj(content))
-        if area.id in [p.username for p in self.__game.players.values()] or \
-                area.id in [a.id for a in self.__game.all_areas.values()]:  # Add a digit to duplicate ids
-            n = 1
-            disallowed = [p.username for p in self.__game.players.values()] + [a.id for a in self.__game.all_areas.values()]
-            while f"{area.id}{n}" in disallowed:  # No I didn't test this lol it compiles
-                n += 1
-            area.id = f"{area.id}{n}"
-        area.id = self.__mutablize_obj(new_area.id)
         area.flags = self.__mutablize_obj(new_area.flags)
 
         is_allowed = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_create_new_area'):
             is_allowed = self.__run_card_handler(card, 'handle_create_new_area',
                                                  requestor, area, self.__game)
             if is_allowed is not None:
@@ -564,6 +1004,9 @@ class Kernel:
 
         if is_allowed:
             self.__game.all_areas[area.id] = area
+            self.__game.area_ids.reserve(area.id)
+            self.__invalidate()
+            self.__touch_areas(area)
             self.__run_all_hooks('on_create_new_area', area, self.__game)
             return area
         return None
@@ -587,7 +1030,7 @@ class Kernel:
 
         is_allowed = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_change_turnorder'):
             is_allowed = self.__run_card_handler(card, 'handle_change_turnorder',
                                                  requestor, order, self.__game)
             if is_allowed is not None:
@@ -602,6 +1045,7 @@ class Kernel:
                 is_allowed = False
             else:
                 self.__game.turn_order = order
+                self.__invalidate(views=False)
                 self.__run_all_hooks('on_change_turnorder', order, self.__game)
 
         return is_allowed
@@ -624,7 +1068,7 @@ class Kernel:
             player = self.__mutablize_obj(p)
             order.append(player)
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_change_temporary_turnorder'):
             is_allowed = self.__run_card_handler(card, 'handle_change_temporary_turnorder',
                                                  requestor, order, self.__game)
             if is_allowed is not None:
@@ -637,6 +1081,7 @@ class Kernel:
         if is_allowed:
             for p in order:
                 self.__game.turn_q.append(p)
+            self.__invalidate(views=False)
             self.__run_all_hooks('on_change_temporary_turnorder', self.__game)
 
         return is_allowed
@@ -661,7 +1106,7 @@ class Kernel:
         new_card._owners = to_area.owners[:]
         new_card._area = to_area
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_add_card'):
             is_allowed = self.__run_card_handler(card, 'handle_add_card',
                                                  requestor, new_card, to_area, self.__game)
             if is_allowed is not None:
@@ -674,6 +1119,11 @@ class Kernel:
         if is_allowed:
             to_area.contents.append(new_card)
             self.__game.all_cards.append(new_card)
+            self.__index_tags(new_card)
+            if self.__is_active(new_card):
+                self.__active_cards.append(new_card)
+            self.__invalidate()
+            self.__touch_areas(to_area)
             self.__run_all_hooks('on_add_card', new_card, self.__game)
             return new_card
         return None
@@ -692,7 +1142,7 @@ class Kernel:
 
         is_allowed = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_change_play_limit'):
             is_allowed = self.__run_card_handler(card, 'handle_change_play_limit', requestor, new_limit, self.__game)
             if is_allowed is not None:
                 break
@@ -702,6 +1152,7 @@ class Kernel:
 
         if is_allowed:
             self.__game.max_cards_played_this_turn = new_limit
+            self.__invalidate(views=False)
             self.__run_all_hooks('on_change_play_limit', new_limit, self.__game)
         return is_allowed
 
@@ -719,7 +1170,7 @@ class Kernel:
 
         is_allowed = None
 
-        for card in self.__game.all_cards:
+        for card in self.__subscribers('handle_change_draw_limit'):
             is_allowed = self.__run_card_handler(card, 'handle_change_draw_limit', requestor, new_limit, self.__game)
             if is_allowed is not None:
                 break
@@ -729,6 +1180,7 @@ class Kernel:
 
         if is_allowed:
             self.__game.max_cards_drawn_this_turn = new_limit
+            self.__invalidate(views=False)
             self.__run_all_hooks('on_change_draw_limit', new_limit, self.__game)
         return is_allowed
 
@@ -736,6 +1188,8 @@ class Kernel:
         """
         Call all the on_turn_start handlers
         """
+        # The engine just advanced the turn behind our back
+        self.__invalidate(views=False)
         self.__run_all_hooks('on_turn_start', self.__game.current_player, self.__game)
 
 
@@ -750,12 +1204,12 @@ class Kernel:
         :return: [(Player, winner: bool, score: int)] the players, in order of winningness,
         with the winners tagged and the player's scores included.
         """
+        scoreboard = self.score_all()
         players = []
-        for player_name in self.__game.players:
-            player = self.__game[player_name]
-            score = self.score_player(player)
+        for player in self.__game.players.values():
+            score = scoreboard.players[player]
             winningness = 0
-            for card in self.__game.all_cards:
+            for card in self.__subscribers('handle_winner'):
                 val = self.__run_card_handler(card, 'handle_winner', player, score,
                                             self.__game)
                 if val == True:
@@ -769,10 +1223,10 @@ class Kernel:
             if data[1] > 0:
                 use_default = False
 
-        players = sorted(players, key=lambda data: data[2])
+        players = sorted(players, key=lambda data: data[2], reverse=True)
         if use_default:
             players[0][1] += 1
 
-        players = sorted(players, key=lambda data: data[1])
+        players = sorted(players, key=lambda data: data[1], reverse=True)
 
         return [(p[0], p[1] > 0, p[2]) for p in players]
@@ -1,30 +1,104 @@
+from collections import OrderedDict
+from collections.abc import MutableSet
 from enum import Enum
-from random import getrandbits
-from typing import Dict, Optional, List
+from itertools import count, islice
+from random import Random
+from typing import Dict, Iterable, Optional, List
 
-from bwc.util import immutablize, random_id
+from bwc.util import IdAllocator, immutablize, prepare_proxies, random_id
+
+# Source of uuids for cards, areas and players; a counter rather than random bits so that
+# two objects can never collide
+_uuids = count(1)
+
+
+class FlagSet(MutableSet):
+    """
+    A set of CardFlags or AreaFlags, kept as the bits of one int instead of a set object.
+    Behaves like a set, and compares equal to a set of the same flags.
+    """
+    __slots__ = ('bits',)
+    kind = None  # the Enum of the flags that can be in the set, set by subclasses
+
+    def __init__(self, flags: Iterable = ()):
+        self.bits = 0
+        for flag in flags:
+            self.add(flag)
+
+    def __contains__(self, flag):
+        return type(flag) is self.kind and self.bits & flag.bit != 0
+
+    def __iter__(self):
+        return (flag for flag in self.kind if self.bits & flag.bit)
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def add(self, flag):
+        if type(flag) is not self.kind:
+            raise TypeError(f"{flag!r} is not a {self.kind.__name__}")
+        self.bits |= flag.bit
+
+    def discard(self, flag):
+        if type(flag) is self.kind:
+            self.bits &= ~flag.bit
+
+    def copy(self):
+        copy = type(self)()
+        copy.bits = self.bits
+        return copy
+
+    def __repr__(self):
+        return repr(set(self)) if self.bits else f'{type(self).__name__}()'
+
+
+class BitEnum(Enum):
+    """
+    An Enum whose members each get a bit of their own, in the order they're defined, for FlagSet
+    """
+
+    def __init__(self, *args):
+        self.bit = 1 << len(type(self).__members__)
 
 
 # (editable) data tied to the card itself, and not the game
 class Card:
+    # Every card has these fields, so they live in slots instead of a __dict__.  Card classes
+    # that don't declare __slots__ themselves still get a __dict__ for their own attributes
+    __slots__ = ('val', 'name', 'image', '_flags', 'tags', '_owners', '_player', '_area', '_uuid')
+
     def __init__(self):
         self.val = 0  # point value of card
         self.name = ''  # name of card
         self.image = None  # image on card
-        self.flags = set()  # identifiers for card (government system, play at any time, etc.)
+        self.flags = ()  # identifiers for card (government system, play at any time, etc.), see CardFlags
         self.tags = set()  # card identifiers for other cards to use (animal, vegetable, mineral)
         # !!! these properties should ONLY be edited by the Kernel
         # !!! this card should only reference them immutably, using the @properties below
         self._owners = []  # owners of the area this card is in
         self._player = None  # person who moved this card into play
         self._area = None  # area this card resides in (hand, play, deck, etc.)
-        self._uuid = getrandbits(32)  # unique identifier to distinguish from copies
+        self._uuid = next(_uuids)  # unique identifier to distinguish from copies
         self.init()
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Register which handlers this card class actually overrides, so the Kernel
+        # never has to call the no-op defaults defined below
+        cls._hooks = frozenset(hook for hook in HOOK_NAMES if getattr(cls, hook) is not getattr(Card, hook))
+        # Build the read-only view class now, rather than when a card first looks at this one
+        prepare_proxies([cls])
+
     def __eq__(self, other):
+        # Cards are equal only to themselves (or an immutable proxy of themselves);
+        # use structurally_equal to compare their contents
+        other = getattr(other, '_backing_obj', other)
         if not isinstance(other, Card):
             return NotImplemented
-        return all(getattr(self, x) == getattr(other, x) for x in ('val', 'name', 'image', 'flags', 'tags', '_owners', '_player', '_area', '_uuid'))
+        return self._uuid == other._uuid
+
+    def __hash__(self):
+        return hash(self._uuid)
 
     def init(self):
         """
@@ -55,6 +129,23 @@ class Card:
     def uuid(self):
         return immutablize(self._uuid)
 
+    @property
+    def flags(self) -> 'CardFlags':
+        return self._flags
+
+    @flags.setter
+    def flags(self, flags: Iterable['CardFlag']):
+        # Cards set their flags as a plain set; they're kept as bits
+        self._flags = CardFlags(flags)
+
+    @property
+    def flag_bits(self) -> int:
+        """
+        The card's flags as an int, e.g. `card.flag_bits & PLAY_ANY_TIME`; quicker than
+        `CardFlag.PLAY_ANY_TIME in card.flags`
+        """
+        return self._flags.bits
+
     def handle_look(self, kernel, player, area, gamestate):
         """
         This handler is called whenever a player tries to examine ANY area.
@@ -477,7 +568,12 @@ class Card:
         pass
 
 
-class CardFlag(Enum):
+# Every handler a card can subscribe to by overriding it
+HOOK_NAMES = tuple(attr for attr in vars(Card) if attr.startswith(('handle_', 'on_')))
+Card._hooks = frozenset()
+
+
+class CardFlag(BitEnum):
     PLAY_ANY_TIME = 'Play at any time'
     """
     This flag marks a card that can be played even when it isn't the player's turn,
@@ -503,25 +599,79 @@ class CardFlag(Enum):
     """
     This flag marks a card that cannot be played into the center area
     """
+    VOLATILE_SCORE = "Score can change at any time"
+    """
+    This flag marks a card whose score depends on something other than the game state, so
+    the kernel never caches scores this card took part in
+    """
+
+
+class CardFlags(FlagSet):
+    __slots__ = ()
+    kind = CardFlag
+
+
+# The bit of each CardFlag, for checking Card.flag_bits in a single operation
+PLAY_ANY_TIME = CardFlag.PLAY_ANY_TIME.bit
+ALWAYS_GET_EVENTS = CardFlag.ALWAYS_GET_EVENTS.bit
+ONLY_PLAY_TO_SELF = CardFlag.ONLY_PLAY_TO_SELF.bit
+NO_PLAY_TO_SELF = CardFlag.NO_PLAY_TO_SELF.bit
+ONLY_PLAY_TO_CENTER = CardFlag.ONLY_PLAY_TO_CENTER.bit
+NO_PLAY_TO_CENTER = CardFlag.NO_PLAY_TO_CENTER.bit
+VOLATILE_SCORE = CardFlag.VOLATILE_SCORE.bit
 
 
 class Area:
-    def __init__(self, disallowed=None):
-        if disallowed is None:
-            disallowed = []
+    __slots__ = ('owners', 'viewers', '_contents', 'id', '_flags', '_uuid')
+
+    def __init__(self, disallowed=None, area_id: Optional[str] = None, rng: Optional[Random] = None):
+        """
+        :param area_id: the area's id.  Without one, a random id not in disallowed is made up,
+        using rng (pass Game.rng, so seeded games stay the same)
+        """
         self.owners = []  # players who can play from or are affected by this area
         self.viewers = self.owners[:]  # players who can see the contents of this area
-        self.contents = []  # the cards in this area
-        self.id = random_id(disallowed)
-        self.flags = set()  # extra data associated with this area
+        self.contents = ()  # the cards in this area, front to back, see AreaContents
+        self.id = area_id if area_id is not None else random_id(disallowed, rng)
+        self.flags = ()  # extra data associated with this area, see AreaFlags
+        self._uuid = next(_uuids)  # identifies this area even if its id changes
+
+    @property
+    def contents(self) -> 'AreaContents':
+        return self._contents
+
+    @contents.setter
+    def contents(self, cards: Iterable[Card]):
+        # The cards can be set as a list; they're kept indexed
+        self._contents = AreaContents(cards)
+
+    @property
+    def flags(self) -> 'AreaFlags':
+        return self._flags
+
+    @flags.setter
+    def flags(self, flags: Iterable['AreaFlag']):
+        self._flags = AreaFlags(flags)
+
+    @property
+    def flag_bits(self) -> int:
+        """
+        The kind of area this is, as an int, e.g. `area.flag_bits & PLAY_AREA`; quicker than
+        `AreaFlag.PLAY_AREA in area.flags`
+        """
+        return self._flags.bits
 
     def __eq__(self, other):
+        other = getattr(other, '_backing_obj', other)
         if not isinstance(other, Area):
             return NotImplemented
-        return all(getattr(self, x) == getattr(other, x) for x in ('owners', 'viewers', 'contents', 'flags', 'id'))
+        return self._uuid == other._uuid
 
+    def __hash__(self):
+        return hash(self._uuid)
 
-class AreaFlag(Enum):  # area types
+
+class AreaFlag(BitEnum):  # area types
     PLAY_AREA = 'PLAY AREA'
     """
     This flag marks the area as a Play Area, which means that by default, cards in
@@ -545,17 +695,394 @@ class AreaFlag(Enum):  # area types
     """
 
 
+class AreaFlags(FlagSet):
+    __slots__ = ()
+    kind = AreaFlag
+
+
+# The bit of each AreaFlag, for checking Area.flag_bits in a single operation
+PLAY_AREA = AreaFlag.PLAY_AREA.bit
+DRAW_AREA = AreaFlag.DRAW_AREA.bit
+HAND_AREA = AreaFlag.HAND_AREA.bit
+DISCARD_AREA = AreaFlag.DISCARD_AREA.bit
+
+
 class Player:
+    __slots__ = ('username', 'hand', 'area', 'score', '_uuid')
+
     def __init__(self):
         self.username = ''  # the name of the player
         self.hand = None  # the player's hand
         self.area = None  # the player's play area
         self.score = 0  # the player's score
+        self._uuid = next(_uuids)  # identifies this player
 
     def __eq__(self, other):
+        other = getattr(other, '_backing_obj', other)
         if not isinstance(other, Player):
             return NotImplemented
-        return all(getattr(self, x) == getattr(other, x) for x in ('username', 'hand', 'area', 'score'))
+        return self._uuid == other._uuid
+
+    def __hash__(self):
+        return hash(self._uuid)
+
+
+# The attributes that make up each object's state, for structurally_equal
+_STRUCTURAL_FIELDS = (
+    (Card, ('val', 'name', 'image', 'flags', 'tags', '_owners', '_player', '_area')),
+    (Area, ('owners', 'viewers', 'contents', 'flags', 'id')),
+    (Player, ('username', 'hand', 'area', 'score')),
+)
+
+
+def structurally_equal(first, second) -> bool:
+    """
+    Compare two Cards, Areas or Players attribute by attribute instead of by identity.
+    Game objects referenced by those attributes are still compared by identity, so this
+    never walks the whole game state.  Mostly useful for tests.
+
+    :param first: the first object
+    :param second: the object to compare it to
+    :return: True if both objects are of the same kind and hold the same state
+    """
+    first = getattr(first, '_backing_obj', first)
+    second = getattr(second, '_backing_obj', second)
+    for cls, fields in _STRUCTURAL_FIELDS:
+        if isinstance(first, cls):
+            return isinstance(second, cls) and \
+                all(getattr(first, field) == getattr(second, field) for field in fields)
+    return first == second
+
+
+class CardOrder:
+    """
+    The callback priority order of a game's cards: cards near the front have their handlers
+    called first.  Bumping a card to the front, adding and removing cards are all constant
+    time, and iteration is stable between changes.
+    """
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        self._cards = OrderedDict((card._uuid, card) for card in cards)
+
+    def bump(self, card: Card):
+        """
+        Move a card to the front of the order, adding it if it isn't there yet
+        """
+        self._cards[card._uuid] = card
+        self._cards.move_to_end(card._uuid, last=False)
+
+    def append(self, card: Card):
+        self._cards[card._uuid] = card
+
+    def extend(self, cards: Iterable[Card]):
+        for card in cards:
+            self.append(card)
+
+    def discard(self, card: Card):
+        self._cards.pop(card._uuid, None)
+
+    def place(self, card: Card, order: Iterable[Card]):
+        """
+        Add a card at the place it has in another order (like game.all_cards) that holds every
+        card of this one.  Unlike the other changes this walks the other order, so it's only
+        for the rare card that starts getting events without being bumped
+        """
+        self._cards[card._uuid] = card
+        self._cards.move_to_end(card._uuid)
+        behind = False
+        for other in order:
+            if other is card:
+                behind = True
+            elif behind and other._uuid in self._cards:
+                self._cards.move_to_end(other._uuid)
+
+    def __contains__(self, card):
+        card = getattr(card, '_backing_obj', card)
+        return isinstance(card, Card) and self._cards.get(card._uuid) is card
+
+    def __iter__(self):
+        return iter(self._cards.values())
+
+    def __reversed__(self):
+        return reversed(self._cards.values())
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __getitem__(self, index):
+        # Positional access has to walk the order; it's only here so cards can still pick from it
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self._cards)
+        if not 0 <= index < len(self._cards):
+            raise IndexError("CardOrder index out of range")
+        return next(islice(self._cards.values(), index, None))
+
+    def __repr__(self):
+        return f"CardOrder({list(self._cards.values())!r})"
+
+
+class AreaContents:
+    """
+    The cards in an area, front to back.  Reads like a list of cards, but also knows where each
+    card is, so checking for a card, taking any card out and putting a card in front or behind
+    are constant time, and indexing is at worst logarithmic.  Iterating goes over the cards as
+    they were when iteration started, so cards can be moved out of an area while looping over it.
+    Inserting anywhere but the front or the back takes linear time, like it does for a list.
+    """
+
+    def __init__(self, cards: Iterable[Card] = ()):
+        # The cards back to front, so the front of the area is the end of the list.  Removing a
+        # card leaves a None behind, which is only cleaned up once there are more holes than cards
+        self._cards: List[Optional[Card]] = list(cards)[::-1]
+        self._positions: Dict[int, int] = {card._uuid: position for position, card in enumerate(self._cards)}
+        self._start = 0  # _cards before this index are all empty
+        self._holes = 0  # empty spots after _start
+        # Fenwick tree counting the cards in _cards, so that indexing can skip the holes.  Only
+        # built when indexing while there are holes, and dropped once there aren't any
+        self._tree: Optional[List[int]] = None
+        if len(self._positions) != len(self._cards):
+            raise ValueError("A card can only be in an area once")
+
+    def push_front(self, card: Card):
+        """
+        Put a card in front of the others
+        """
+        if card._uuid in self._positions:
+            raise ValueError(f"{card!r} is already in the area")
+        self._positions[card._uuid] = len(self._cards)
+        self._cards.append(card)
+        tree = self._tree
+        if tree is not None:
+            # The new node covers the spots (n - lowbit(n), n], the last of which is the new card
+            n = len(self._cards)
+            tree.append(1 + self._count(n - 1) - self._count(n - (n & -n)))
+
+    def append(self, card: Card):
+        """
+        Put a card behind the others
+        """
+        if card._uuid in self._positions:
+            raise ValueError(f"{card!r} is already in the area")
+        if not self._start:
+            # Make room at the back for this card and as many more
+            room = max(len(self._cards), 4)
+            self._cards[:0] = [None] * room
+            self._start = room
+            for uuid in self._positions:
+                self._positions[uuid] += room
+            self._tree = None
+        self._start -= 1
+        self._cards[self._start] = card
+        self._positions[card._uuid] = self._start
+        if self._tree is not None:
+            self._add(self._start, 1)
+
+    def insert(self, index: int, card: Card):
+        """
+        Put a card in the area so that index cards are in front of it, like list.insert.
+        Use push_front or append to put it in front or behind, which don't take linear time
+        """
+        length = len(self._positions)
+        if index < 0:
+            index = max(index + length, 0)
+        if index == 0:
+            self.push_front(card)
+        elif index >= length:
+            self.append(card)
+        elif card._uuid in self._positions:
+            raise ValueError(f"{card!r} is already in the area")
+        else:
+            # Right in front of the card at index, and every spot in front of it moves up one
+            position = self._position(index) + 1
+            self._cards.insert(position, card)
+            for spot in range(position, len(self._cards)):
+                if self._cards[spot] is not None:
+                    self._positions[self._cards[spot]._uuid] = spot
+            self._tree = None
+
+    def extend(self, cards: Iterable[Card]):
+        for card in list(cards):
+            self.append(card)
+
+    def __iadd__(self, cards: Iterable[Card]):
+        self.extend(cards)
+        return self
+
+    def remove(self, card: Card):
+        """
+        Take a card out of the area
+
+        :raise ValueError: if the card isn't in the area
+        """
+        position = self._positions.pop(getattr(card, '_uuid', None), None)
+        if position is None:
+            raise ValueError(f"{card!r} is not in the area")
+        cards = self._cards
+        if position == len(cards) - 1:
+            # The front card, like drawing from a pile.  The last nodes of the tree only count
+            # the spots that go, so it shrinks along
+            cards.pop()
+            while len(cards) > self._start and cards[-1] is None:
+                cards.pop()
+                self._holes -= 1
+            if self._tree is not None:
+                del self._tree[len(cards) + 1:]
+        elif position == self._start:
+            # The back card
+            cards[position] = None
+            self._start += 1
+            while self._start < len(cards) and cards[self._start] is None:
+                self._start += 1
+                self._holes -= 1
+            if self._tree is not None:
+                self._add(position, -1)
+        else:
+            cards[position] = None
+            self._holes += 1
+            if self._tree is not None:
+                self._add(position, -1)
+            if self._holes > len(self._positions):
+                self._compact()
+        if not self._positions:
+            self._cards = []
+            self._start = self._holes = 0
+        if not self._holes:
+            self._tree = None
+
+    def discard(self, card: Card):
+        """
+        Take a card out of the area, if it's there
+        """
+        if card in self:
+            self.remove(card)
+
+    def index(self, card: Card) -> int:
+        """
+        :return: how many cards are in front of card
+        :raise ValueError: if the card isn't in the area
+        """
+        if card not in self:
+            raise ValueError(f"{card!r} is not in the area")
+        position = self._positions[card._uuid]
+        if self._holes:
+            # Every card from this one on, but this one
+            return len(self._positions) - self._count(position + 1)
+        return len(self._cards) - 1 - position
+
+    def _compact(self):
+        cards = [card for card in islice(self._cards, self._start, None) if card is not None]
+        self._cards = cards
+        self._positions = {card._uuid: position for position, card in enumerate(cards)}
+        self._start = self._holes = 0
+        self._tree = None
+
+    def _build_tree(self) -> List[int]:
+        # tree[n] counts the cards in the spots (n - lowbit(n), n], spots counted from 1
+        tree = [0]
+        tree.extend(card is not None for card in self._cards)
+        for n in range(1, len(tree)):
+            parent = n + (n & -n)
+            if parent < len(tree):
+                tree[parent] += tree[n]
+        self._tree = tree
+        return tree
+
+    def _count(self, spots: int) -> int:
+        """
+        :return: how many cards are in the first spots spots of _cards
+        """
+        tree = self._tree if self._tree is not None else self._build_tree()
+        count = 0
+        while spots:
+            count += tree[spots]
+            spots &= spots - 1
+        return count
+
+    def _add(self, position: int, change: int):
+        tree = self._tree
+        n = position + 1
+        while n < len(tree):
+            tree[n] += change
+            n += n & -n
+
+    def _position(self, index: int) -> int:
+        """
+        :return: where in _cards the card with index cards in front of it is; index must be in range
+        """
+        if not self._holes:
+            return len(self._cards) - 1 - index
+        # Find the spot with (cards - index) cards up to and including it, walking down the tree
+        tree = self._tree if self._tree is not None else self._build_tree()
+        remaining = len(self._positions) - index
+        n = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            if n + step < len(tree) and tree[n + step] < remaining:
+                n += step
+                remaining -= tree[n]
+            step >>= 1
+        return n
+
+    def __contains__(self, card):
+        card = getattr(card, '_backing_obj', card)
+        if not isinstance(card, Card):
+            return False
+        position = self._positions.get(card._uuid)
+        return position is not None and self._cards[position] is card
+
+    def __iter__(self):
+        cards = self._cards[self._start:]
+        if self._holes:
+            return (card for card in reversed(cards) if card is not None)
+        return reversed(cards)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._cards[self._position(i)] for i in range(*index.indices(len(self._positions)))]
+        if index < 0:
+            index += len(self._positions)
+        if not 0 <= index < len(self._positions):
+            raise IndexError("AreaContents index out of range")
+        return self._cards[self._position(index)]
+
+    def __add__(self, other):
+        other = getattr(other, '_backing_obj', other)
+        if not isinstance(other, (AreaContents, list)):
+            return NotImplemented
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        if not isinstance(other, list):
+            return NotImplemented
+        return other + list(self)
+
+    def __eq__(self, other):
+        other = getattr(other, '_backing_obj', other)
+        if not isinstance(other, (AreaContents, list)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"AreaContents({list(self)!r})"
+
+
+class Scoreboard:
+    """
+    Every score in a game at one point in time, as computed by Kernel.score_all
+    """
+
+    def __init__(self, version: int):
+        self.version = version  # the Kernel.version these scores were computed at
+        self.cards: Dict[Card, int] = {}  # the score of every card in a play area
+        self.areas: Dict[Area, int] = {}  # the score of every play area
+        self.players: Dict[Player, int] = {}  # the score of every player
 
 
 class Game:
@@ -566,7 +1093,9 @@ class Game:
         self.draw: Optional[Area] = None  # reference to the draw pile
         self.discard: Optional[Area] = None  # reference to the discard pile
         self.all_areas: Dict[str, Area] = {}  # references to *every* area in the game
-        self.all_cards: List[Card] = []  # references to each card in the game; as cards are played they are moved towards the front
+        self.rng: Random = Random()  # every random choice in the game comes from here, see Engine.setup_game
+        self.area_ids: IdAllocator = IdAllocator(rng=self.rng)  # area ids and usernames in use, so new areas get unique ids
+        self.all_cards: CardOrder = CardOrder()  # references to each card in the game; as cards are played they are moved towards the front
 
         self.turn_order = self.players.values()  # normal turn rotation
         self.turn_q: List[Player] = []  # turn rotation override
@@ -580,3 +1109,7 @@ class Game:
         self.cards_drawn_this_turn: int = 0
 
         self.is_over: bool = False  # whether or not the game is over; set to true after the game ends
+
+
+# Build the read-only view classes of everything cards get to look at up front
+prepare_proxies([Card, Area, Player, Game, CardOrder, AreaContents, Scoreboard, CardFlags, AreaFlags, list, dict, set])
@@ -0,0 +1,147 @@
+import asyncio
+from collections import deque
+import traceback
+from typing import Iterable
+
+from websockets import ConnectionClosed
+
+from bwc.server_rendering import dumps
+
+# What a client's Outbox does when too much is waiting to be sent to it
+OVERFLOW_POLICIES = ("coalesce", "drop", "disconnect")
+DEFAULT_OUTBOX_SIZE = 64
+DEFAULT_OVERFLOW = "coalesce"
+# Seconds to wait for clients to be sent the end of the game before giving up on them
+FLUSH_TIMEOUT = 10
+
+
+class Outbox():
+    """
+    Everything waiting to be sent to a client.  It is sent by the outbox's own writer task, so
+    broadcasting to a room never waits on its slowest client.  Game state updates are queued as
+    markers and only built when their turn to be sent comes, so they always carry the latest
+    state, and leaving some out never leaves the client with a gap.
+
+    When more than size items are waiting, overflow says what to do:
+    * coalesce: every waiting update is merged into one, sent after the waiting messages
+    * drop: the oldest waiting update is dropped, as long as a newer one is waiting
+    * disconnect: the client is disconnected
+    Messages are never left out, since the client can't get them back, so if that doesn't make
+    room the client is disconnected as well
+    """
+    def __init__(self, websocket, send_update, size=DEFAULT_OUTBOX_SIZE, overflow=DEFAULT_OVERFLOW):
+        """
+        send_update(final) is the coroutine function that sends the client an update
+        """
+        self.websocket = websocket
+        self.send_update = send_update
+        self.size = size
+        self.overflow = overflow
+
+        # ("frame", text) to send already encoded JSON, or ("update", final) to call send_update
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.drained.set()
+        self.closed = False
+        self.writer = asyncio.create_task(self.write())
+
+    def put_message(self, data):
+        self.put(("frame", dumps(data)))
+
+    def put_frame(self, frame):
+        """
+        Queues a message that was already JSON-encoded, so a broadcast only encodes it once
+        """
+        self.put(("frame", frame))
+
+    def put_update(self, final=False):
+        self.put(("update", final))
+
+    def put(self, item):
+        if self.closed:
+            return
+        self.queue.append(item)
+        if len(self.queue) > self.size:
+            self.overflowed()
+        if self.queue:
+            self.drained.clear()
+            self.wakeup.set()
+
+    def overflowed(self):
+        updates = [i for i, (kind, _) in enumerate(self.queue) if kind == "update"]
+        if len(updates) > 1 and self.overflow == "coalesce":
+            final = any(self.queue[i][1] for i in updates)
+            self.queue = deque(item for item in self.queue if item[0] != "update")
+            self.queue.append(("update", final))
+        elif len(updates) > 1 and self.overflow == "drop":
+            if self.queue[updates[0]][1]:
+                # The newest update takes over being the final one
+                self.queue[updates[-1]] = ("update", True)
+            del self.queue[updates[0]]
+        if len(self.queue) > self.size:
+            print(f"Client fell {len(self.queue)} messages behind, disconnecting it")
+            self.disconnect()
+
+    async def write(self):
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.queue:
+                    kind, data = self.queue.popleft()
+                    try:
+                        if kind == "update":
+                            await self.send_update(data)
+                        else:
+                            await self.websocket.send(data)
+                    except ConnectionClosed:
+                        # The handler in the main code takes care of removing the client
+                        return
+                    except Exception:
+                        # Only this item is lost; the client still gets everything after it
+                        traceback.print_exc()
+                self.drained.set()
+        finally:
+            # However the writer stopped, nothing should wait on it anymore
+            self.closed = True
+            self.queue.clear()
+            self.drained.set()
+
+    async def flush(self):
+        """
+        Waits until everything queued so far has been sent, or the outbox is closed
+        """
+        await self.drained.wait()
+
+    def close(self):
+        """
+        Stops sending to the client, dropping whatever is still waiting
+        """
+        self.closed = True
+        self.queue.clear()
+        self.drained.set()
+        if self.writer is not asyncio.current_task():
+            self.writer.cancel()
+
+    def disconnect(self):
+        """
+        Closes the outbox and the client's connection, for clients that stopped keeping up
+        """
+        self.close()
+        asyncio.create_task(self.websocket.close())
+
+
+async def flush_outboxes(outboxes: Iterable[Outbox], timeout=FLUSH_TIMEOUT):
+    """
+    Waits until everything queued so far has been sent to every client, disconnecting the
+    clients that still haven't been sent everything after timeout seconds
+    """
+    outboxes = list(outboxes)
+    try:
+        await asyncio.wait_for(asyncio.gather(*(outbox.flush() for outbox in outboxes)), timeout)
+    except asyncio.TimeoutError:
+        for outbox in outboxes:
+            if not outbox.drained.is_set():
+                print(f"Client still had {len(outbox.queue)} messages waiting, disconnecting it")
+                outbox.disconnect()
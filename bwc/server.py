@@ -7,10 +7,10 @@ from sanic import Sanic, response
 from sanic.websocket import WebSocketProtocol
 import sys
 from typing import Callable, List, Optional, Tuple, Union
-from websockets import ConnectionClosedError
 
 from bwc.engine import Engine
 from bwc.objects import Player
+from bwc.outbox import DEFAULT_OUTBOX_SIZE, DEFAULT_OVERFLOW, OVERFLOW_POLICIES, Outbox, flush_outboxes
 from bwc.server_rendering import *
 from bwc.util import is_valid_player_name, is_valid_room_name, random_id
 
@@ -18,9 +18,9 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 NOT_FOUND_CARD = "/placeholder-card.png"
 
 async def send_json(websocket, data):
-    await websocket.send(json.dumps(data))
+    await websocket.send(dumps(data))
 
-async def send_card(websocket, card):
+def wrap_card(card):
     card_image = card.image
     if card.image is None:
         card_image = NOT_FOUND_CARD
@@ -28,14 +28,17 @@ async def send_card(websocket, card):
     flags_string = ", ".join([f.value for f in card.flags])
     tags_string = ", ".join(card.tags)
 
-    await send_json(websocket, {
+    return {
         "type": "inspect",
         "url": card_image,
         "title": card.name,
         "value": card.val,
         "flags": flags_string,
         "tags": tags_string
-    })
+    }
+
+async def send_card(websocket, card):
+    await send_json(websocket, wrap_card(card))
 
 def wrap_message(message):
     return {
@@ -47,49 +50,143 @@ async def send_message(websocket, message):
     await send_json(websocket, wrap_message(message))
 
 
-async def send_choices(websocket, choices):
-    await send_json(websocket, {
+def wrap_choices(choices):
+    return {
         "type": "choices",
         "choices": choices
-    })
+    }
 
+async def send_choices(websocket, choices):
+    await send_json(websocket, wrap_choices(choices))
 
-async def send_update(websocket, engine, player):
-    hand_field = ""
-    play_field = ""
 
+# How a client wants the game state: "state" is structured data the client renders itself,
+# "html" is the old pre-rendered HTML, kept for older clients
+PROTOCOLS = ("state", "html")
+
+
+class ClientView():
+    """
+    What a client was last sent, so updates only need to carry what changed
+    """
+    def __init__(self, protocol="html"):
+        self.protocol = protocol
+        # Number of the last update sent, so the client can tell when it missed one
+        self.seq = 0
+        # Area id => (area version, whether the player could look, score) as last sent
+        self.areas = dict()
+
+
+async def send_update(websocket, engine, player, scoreboard=None, view=None, cache=None):
+    """
+    Sends a player the game state.  Given the ClientView of what the client already has, only
+    the areas whose contents, score or visibility changed are sent, in a "state_areas" (or for
+    the html protocol, "update_areas") message.  Without one, or if areas came or went, the
+    whole state is sent as a "state" (or "update") message
+
+    Areas come from cache, a RenderCache for the current version of the game shared by every
+    player's update, so areas that look the same to several players are only rendered once
+    """
+    if scoreboard is None:
+        scoreboard = engine.kernel.score_all()
+    if cache is None:
+        cache = RenderCache(engine.kernel.version)
+
+    # Look at each area once, whether or not it ends up being sent
+    looks = []
+    signatures = dict()
     for area in engine.game.all_areas.values():
-        if AreaFlag.PLAY_AREA in area.flags:
-            play_field += format_area(engine, player, area) + "\n\n"
-        else:
-            hand_field += format_area(engine, player, area) + "\n\n"
+        looked = engine.kernel.look_at(player, area)
+        signatures[area.id] = area_signature(engine, area, looked, scoreboard)
+        looks.append((area, looked))
 
-    hand_field = hand_field.strip()
-    play_field = play_field.strip()
+    structured = view is not None and view.protocol == "state"
 
-    await send_json(websocket, {
+    if view is not None and view.areas.keys() == signatures.keys():
+        changed = [(area, looked) for area, looked in looks if view.areas[area.id] != signatures[area.id]]
+        view.areas = signatures
+        if not changed:
+            return
+        view.seq += 1
+        if structured:
+            areas = ", ".join(cache.area_state(engine, player, area, scoreboard, looked, signatures[area.id])
+                              for area, looked in changed)
+            await websocket.send(encode_message({
+                "type": "state_areas",
+                "version": STATE_VERSION,
+                "seq": view.seq
+            }, {"areas": f"[{areas}]"}))
+        else:
+            areas = ", ".join(encode_message({"id": area.id}, {
+                "html": f'"{cache.area_html(engine, player, area, scoreboard, looked, signatures[area.id])}"'
+            }) for area, looked in changed)
+            await websocket.send(encode_message({
+                "type": "update_areas",
+                "seq": view.seq
+            }, {"areas": f"[{areas}]"}))
+        return
+
+    seq = 0
+    if view is not None:
+        # Update the view before sending, so an update sent meanwhile builds on this one
+        view.areas = signatures
+        view.seq += 1
+        seq = view.seq
+
+    if structured:
+        areas = ", ".join(cache.area_state(engine, player, area, scoreboard, looked, signatures[area.id])
+                          for area, looked in looks)
+        await websocket.send(encode_message({
+            "type": "state",
+            "version": STATE_VERSION,
+            "seq": seq
+        }, {"areas": f"[{areas}]"}))
+        return
+
+    hand_areas = []
+    play_areas = []
+
+    for area, looked in looks:
+        encoded = cache.area_html(engine, player, area, scoreboard, looked, signatures[area.id])
+        if area.flag_bits & PLAY_AREA:
+            play_areas.append(encoded)
+        else:
+            hand_areas.append(encoded)
+
+    # The areas are already encoded, so this is "\n\n" as it appears inside a JSON string
+    separator = "\\n\\n"
+    await websocket.send(encode_message({
         "type": "update",
-        "hand": hand_field,
-        "play": play_field
-    })
+        "seq": seq
+    }, {
+        "hand": f'"{separator.join(hand_areas)}"',
+        "play": f'"{separator.join(play_areas)}"'
+    }))
+
 
+async def send_final_update(websocket, engine, player, scoreboard=None, view=None):
+    if scoreboard is None:
+        scoreboard = engine.kernel.score_all()
+
+    if view is not None and view.protocol == "state":
+        await send_json(websocket, game_state(engine, player, scoreboard, final=True))
+        return
 
-async def send_final_update(websocket, engine, player):
     hand_field = ""
     play_field = ""
 
-    for player in engine.game.players.values():
-        score = engine.kernel.score_player(player)
-        play_field += f"{format_player(player)}: {format_score(score)}\n"
+    for scored_player in engine.game.players.values():
+        score = scoreboard.players[scored_player]
+        play_field += f"{format_player(scored_player.username)}: {format_score(score)}\n"
 
     play_field += "\n"
 
     # Do the rest of the update like normal
     for area in engine.game.all_areas.values():
-        if AreaFlag.PLAY_AREA in area.flags:
-            play_field += format_area(engine, player, area) + "\n\n"
+        if area.flag_bits & PLAY_AREA:
+            play_field += format_area(engine, player, area, scoreboard) + "\n\n"
         else:
-            hand_field += format_area(engine, player, area) + "\n\n"
+            hand_field += format_area(engine, player, area, scoreboard) + "\n\n"
 
     hand_field = hand_field.strip()
     play_field = play_field.strip()
@@ -121,10 +218,18 @@ def parse_names_or_error(args) -> Tuple[bool, Union[Tuple[str, str], Tuple[str,
     return True, (player_name, room_name)
 
 class Room():
-    def __init__(self, name):
+    def __init__(self, name, outbox_size=DEFAULT_OUTBOX_SIZE, overflow=DEFAULT_OVERFLOW):
         self.name = name
         self.engine = Engine()
         self.clients = dict()
+        # Player name => ClientView of what their client has been sent
+        self.views = dict()
+        # Player name => Outbox of what is waiting to be sent to their client
+        self.outboxes = dict()
+        self.outbox_size = outbox_size
+        self.overflow = overflow
+        # Areas rendered for the current version of the game, see render_cache
+        self.renders = RenderCache()
 
         self.started = asyncio.Event()
         self.stopped = asyncio.Event()
@@ -135,11 +240,14 @@ class Room():
         self.last_choice = dict()
         self.choice_condition = asyncio.Condition()
 
-    async def add_player(self, websocket, player_name) -> bool:
+    async def add_player(self, websocket, player_name, protocol="html") -> bool:
         """
         Returns true iff the player was successfully added
+
+        protocol is how the client wants the game state, one of PROTOCOLS
         """
 
+        # Not through an outbox: this client doesn't have one, and won't get one
         if player_name in self.clients:
             await send_message(websocket, f"Error: '{format_player(player_name)}' is already a player in this room '{self.name}!")
             return False
@@ -149,44 +257,80 @@ class Room():
             return False
 
         self.clients[player_name] = websocket
+        self.views[player_name] = ClientView(protocol)
+        self.outboxes[player_name] = Outbox(websocket, self.update_sender(player_name), self.outbox_size,
+                                            self.overflow)
         self.engine.add_player(player_name)
 
         return True
 
+    def render_cache(self):
+        """
+        The RenderCache for the current version of the game, shared by every client's updates
+        """
+        version = self.engine.kernel.version
+        if self.renders.version != version:
+            self.renders = RenderCache(version)
+        return self.renders
+
+    def update_sender(self, player_name):
+        """
+        Returns the coroutine function a player's Outbox uses to send them an update
+        """
+        async def send(final):
+            client = self.clients[player_name]
+            player = self.engine.get_player(player_name)
+            # Every client shares the same scores, and the kernel keeps them until the game changes
+            scoreboard = self.engine.kernel.score_all()
+            view = self.views.get(player_name)
+            if final:
+                await send_final_update(client, self.engine, player, scoreboard, view)
+            else:
+                await send_update(client, self.engine, player, scoreboard, view, self.render_cache())
+        return send
+
+    def send_to(self, player_name, data):
+        """
+        Sends a message to one client, behind whatever is already waiting to be sent to it, so
+        replies never overtake the updates they are about
+
+        The message is only queued, and dropped if the client has already left
+        """
+
+        outbox = self.outboxes.get(player_name, None)
+        if outbox is not None:
+            outbox.put_message(data)
+
     async def broadcast_message(self, message):
         """
         Sends a message to all clients connected to this room
+
+        The message is only queued, each client's Outbox sends it when it can
         """
 
-        for client in self.clients.values():
-            try:
-                await send_message(client, message)
-            except ConnectionClosedError:
-                # Currently, if another client is disconnected, this could cause
-                # any client that tries to broadcast to them to also get disconnected
-                # because the disconnected client will throw a "DisconnectedError" or
-                # something inside the stil-connected client
-                # So, we ignore that and error and let the handler in the main code
-                # take care of removing clients
-                pass
+        frame = dumps(wrap_message(message))
+        for outbox in self.outboxes.values():
+            outbox.put_frame(frame)
 
     async def broadcast_update(self, final=False):
         """
         Broadcasts the game state to all connected clients
 
         If final=True, then a "final game update" containing the winners is sent
+
+        The update is only queued, each client's Outbox sends it when it can
         """
 
-        for player_name, client in self.clients.items():
-            player = self.engine.get_player(player_name)
-            try:
-                if final:
-                    await send_final_update(client, self.engine, player)
-                else:
-                    await send_update(client, self.engine, player)
-            except ConnectionClosedError:
-                # Same as in broadcast_message
-                pass
+        for outbox in self.outboxes.values():
+            outbox.put_update(final)
+
+    async def flush(self):
+        """
+        Waits until everything broadcast so far has been sent to every client, disconnecting
+        the clients that take too long
+        """
+
+        await flush_outboxes(self.outboxes.values())
 
     def remove_player(self, player_name):
         """
@@ -196,19 +340,19 @@ class Room():
         if player_name in self.clients:
             self.engine.remove_player(player_name)
             del self.clients[player_name]
+            self.views.pop(player_name, None)
+            self.outboxes.pop(player_name).close()
 
     async def kernel_send_message(self, players: List[Player], message: str):
         """
         Async callback function for the kernel to send a message in this room
         """
 
+        frame = dumps(wrap_message(f"<span class='card-message'>{message}</span>"))
         for player in players:
-            client = self.clients.get(player.username, None)
-            if client is not None:
-                try:
-                    await send_message(client, f"<span class='card-message'>{message}</span>")
-                except ConnectionClosedError:
-                    pass
+            outbox = self.outboxes.get(player.username, None)
+            if outbox is not None:
+                outbox.put_frame(frame)
             else:
                 print(f"Player {player.username} was in list to receive message, but they're no longer connected!")
 
@@ -219,13 +363,15 @@ class Room():
 
         # make a copy just in case
         choices = choices[:]
-        client = self.clients.get(player.username, None)
-        if client is None:
+        outbox = self.outboxes.get(player.username, None)
+        if outbox is None:
             print(f"Player {player.username} was supposed to choose something, but they're no longer connected!")
+            # Nobody is left to choose, so the card never hears back
+            return
 
         async with self.choice_condition:
             self.active_choices[player.username] = choices
-            await send_choices(client, choices)
+            outbox.put_message(wrap_choices(choices))
             # Use fancy asyncio magic to make sure that we only continue
             # once our player has made a choice
             await self.choice_condition.wait_for(lambda: player.username in self.last_choice)
@@ -252,22 +398,24 @@ def get_fields(data: dict, fields: Tuple[str, ...]) -> Optional[Tuple[str, ...]]
 
 
 class RoomManager():
-    def __init__(self):
+    def __init__(self, outbox_size=DEFAULT_OUTBOX_SIZE, overflow=DEFAULT_OVERFLOW):
         self.rooms = dict()
+        self.outbox_size = outbox_size
+        self.overflow = overflow
 
     def make_room(self, player_name, room_name) -> Tuple[str, int]:
         print(f"make_room {room_name}")
         if room_name in self.rooms:
             return f"Room '{room_name}' already exists!", 409
 
-        room = Room(room_name)
+        room = Room(room_name, self.outbox_size, self.overflow)
         self.rooms[room_name] = room
         self.rooms[room_name].engine.reset(room.kernel_send_message, room.kernel_get_player_input)
 
         return f"Made room {room_name}", 200
 
-    async def join_room(self, websocket, player_name, room_name):
-        print(f"join_room {room_name} {player_name}")
+    async def join_room(self, websocket, player_name, room_name, protocol="html"):
+        print(f"join_room {room_name} {player_name} {protocol}")
         room = self.rooms.get(room_name, None)
         if room is None:
             await send_message(websocket, f"Error: room '{room_name}' does not exist!")
@@ -277,10 +425,14 @@ class RoomManager():
             await send_message(websocket, f"Player name '{player_name}' is invalid! Only numbers and lowercase letters allowed, no whitespace!")
             return
 
-        if not await room.add_player(websocket, player_name):
+        if protocol not in PROTOCOLS:
+            await send_message(websocket, f"Protocol '{protocol}' is not supported! Use one of {', '.join(PROTOCOLS)}")
+            return
+
+        if not await room.add_player(websocket, player_name, protocol):
             return
 
-        await send_message(websocket, f"Joining room '{room_name}'...")
+        room.send_to(player_name, wrap_message(f"Joining room '{room_name}'..."))
         await room.broadcast_message(f"{format_player(player_name)} has joined the room!")
         # Refresh the screen for everyone
         await room.broadcast_update()
@@ -310,17 +462,19 @@ class RoomManager():
                 # Probably need to refresh the task before yielding execution
                 # to other coroutines, so doing that just in case
                 get_command = asyncio.create_task(websocket.recv())
-                await self.handle_command(websocket, room, player_name, cmd, response)
+                await self.handle_command(room, player_name, cmd, response)
             else:
                 print("Congratulations, you reached the unreachable branch! Asyncio went funky")
 
-        await send_message(websocket, "Game is over, you may leave now")
+        room.send_to(player_name, wrap_message("Game is over, you may leave now"))
+        # The connection closes once this returns, so see it off first
+        await flush_outboxes([room.outboxes[player_name]] if player_name in room.outboxes else [])
 
-    async def handle_command(self, websocket, room, player_name, cmd, data):
+    async def handle_command(self, room, player_name, cmd, data):
         if cmd == "end":
             can_end = room.engine.kernel.end_turn(room.engine.get_player(player_name))
             if not can_end:
-                await send_message(websocket, "You are not allowed to end your turn!")
+                room.send_to(player_name, wrap_message("You are not allowed to end your turn!"))
                 return
 
             room.turn_over.set()
@@ -337,7 +491,7 @@ class RoomManager():
             if res is None:
                 error = f"Malformed move message from client: {data}"
                 print(error)
-                await send_message(websocket, error)
+                room.send_to(player_name, wrap_message(error))
                 return
 
             from_area_id, to_area_id, index = res
@@ -349,22 +503,22 @@ class RoomManager():
             player = room.engine.get_player(player_name)
             from_area = room.engine.get_area(from_area_id)
             if from_area is None:
-                await send_message(websocket, f"Source area '{from_area_id}' does not exist!")
+                room.send_to(player_name, wrap_message(f"Source area '{from_area_id}' does not exist!"))
                 return
 
             if index < 0 or index >= len(from_area.contents):
-                await send_message(websocket, f"Index {index + 1} is out of range for area {format_area_id(from_area)}!")
+                room.send_to(player_name, wrap_message(f"Index {index + 1} is out of range for area {format_area_id(from_area)}!"))
                 return
 
             card = from_area.contents[index]
             to_area = room.engine.get_area(to_area_id)
             if to_area is None:
-                await send_message(websocket, f"Destination area '{to_area_id}' does not exist!")
+                room.send_to(player_name, wrap_message(f"Destination area '{to_area_id}' does not exist!"))
                 return
 
             can_move = room.engine.kernel.move_card(player, card, from_area, to_area)
             if not can_move:
-                await send_message(websocket, "You cannot move this card!")
+                room.send_to(player_name, wrap_message("You cannot move this card!"))
             else:
                 # The kernel moves the card if it succeeds, no need to do anything else
                 await room.broadcast_update()
@@ -376,7 +530,7 @@ class RoomManager():
             if res is None:
                 error = f"Malformed inspect message from client: {data}"
                 print(error)
-                await send_message(websocket, error)
+                room.send_to(player_name, wrap_message(error))
                 return
 
             area_id, index = res
@@ -387,28 +541,28 @@ class RoomManager():
 
             area = room.engine.get_area(area_id)
             if area is None:
-                await send_message(websocket, f"Area '{area_id}' does not exist!")
+                room.send_to(player_name, wrap_message(f"Area '{area_id}' does not exist!"))
                 return
 
             can_look, area_contents = room.engine.kernel.look_at(player, area)
             if not can_look:
-                await send_message(websocket, f"You are not allowed to look at {format_area_id(area)}")
+                room.send_to(player_name, wrap_message(f"You are not allowed to look at {format_area_id(area)}"))
                 return
 
             if index < 0 or index >= len(area_contents):
-                await send_message(websocket, f"Index {index + 1} if out of bounds for {format_area_id(area)}")
+                room.send_to(player_name, wrap_message(f"Index {index + 1} if out of bounds for {format_area_id(area)}"))
                 return
 
             card = area_contents[index]
 
-            await send_card(websocket, card)
+            room.send_to(player_name, wrap_card(card))
             # await room.broadcast_message(f"{format_player(player_name)} looked at card {index + 1} in {format_area_id(area)}")
         elif cmd == "choose":
             index = data.get("which", None)
             if index is None:
                 error = f"Malformed choose message from client: {data}"
                 print(error)
-                await send_message(websocket, error)
+                room.send_to(player_name, wrap_message(error))
                 return
 
             if not isinstance(index, Number):
@@ -416,13 +570,13 @@ class RoomManager():
             index = index - 1
 
             if player_name not in room.active_choices:
-                await send_message(websocket, "You don't have any active choices")
+                room.send_to(player_name, wrap_message("You don't have any active choices"))
                 return
 
             choices = room.active_choices[player_name]
             if index < 0 or index >= len(choices):
-                await send_message(websocket, f"Index {index + 1} is not a valid choice! Please choose again")
-                await send_choices(websocket, choices)
+                room.send_to(player_name, wrap_message(f"Index {index + 1} is not a valid choice! Please choose again"))
+                room.send_to(player_name, wrap_choices(choices))
                 return
 
             async with room.choice_condition:
@@ -437,8 +591,12 @@ class RoomManager():
             # Send messages through the kernel in case cards block/edit them
             # or something in the future
             room.engine.kernel.send_message(list(room.engine.game.players.values()), message)
+        elif cmd == "resync":
+            # The client lost track of the game state, start it over from a full update
+            room.views[player_name] = ClientView(room.views[player_name].protocol)
+            room.outboxes[player_name].put_update()
         else:
-            await send_message(websocket, f"The command '{cmd}' is not supported on this server")
+            room.send_to(player_name, wrap_message(f"The command '{cmd}' is not supported on this server"))
 
     def run_game(self, player_name, room_name) -> Tuple[str, int]:
         print(f"run_game {room_name}")
@@ -475,6 +633,7 @@ class RoomManager():
         await room.broadcast_update(final=True)
         # Wait to actually stop room until final update is send to everyone
         # is guaranteed to receive it
+        await room.flush()
         room.stopped.set()
 
     def remove_from_room(self, player_name, room_name):
@@ -490,8 +649,8 @@ class RoomManager():
     Paths defined:
     * POST /make?p=<player_name>&room=<room_name>
         Makes a new room
-    * WEBSOCKET /join?p=<player_name>&room=<room_name>
-        Joins a room as a player
+    * WEBSOCKET /join?p=<player_name>&room=<room_name>[&protocol=<state|html>]
+        Joins a room as a player, getting the game state in the given protocol (html by default)
     * POST /start?p=<player_name>&room=<room_name>
         Starts a game in an already-created room
     * GET /list
@@ -513,8 +672,10 @@ class RoomManager():
         success, res = parse_names_or_error(request.args)
         if success:
             player_name, room_name = res
+            # Clients that don't ask for a protocol predate the structured one
+            protocol = request.args.get("protocol", "html")
             try:
-                await self.join_room(websocket, player_name, room_name)
+                await self.join_room(websocket, player_name, room_name, protocol)
             finally:
                 self.remove_from_room(player_name, room_name)
                 # If there's no one left connected to the room, DESTROY IT MUAHAHAA
@@ -579,13 +740,18 @@ async def intercept_http(path, headers):
 def make_parser():
     parser = argparse.ArgumentParser(description="Start the 1kbwc server")
     parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--outbox-size', type=int, default=DEFAULT_OUTBOX_SIZE,
+                        help="how many messages can wait to be sent to a client before it counts as falling behind")
+    parser.add_argument('--overflow', choices=OVERFLOW_POLICIES, default=DEFAULT_OVERFLOW,
+                        help="what to do with a client that falls behind: coalesce its updates, drop its stale "
+                             "updates, or disconnect it")
 
     return parser
 
 
-def make_server():
+def make_server(outbox_size=DEFAULT_OUTBOX_SIZE, overflow=DEFAULT_OVERFLOW):
     app = Sanic("1kbwc")
-    manager = RoomManager()
+    manager = RoomManager(outbox_size, overflow)
     app.add_route(manager.serve_make, '/make', methods=['POST'])
     app.add_route(manager.serve_start, '/start', methods=['POST'])
     app.add_route(manager.serve_list, '/list', methods=['GET'])
@@ -598,7 +764,7 @@ def make_server():
 
 def main():
     args = make_parser().parse_args()
-    app = make_server()
+    app = make_server(args.outbox_size, args.overflow)
     app.run(host="0.0.0.0", port=args.port, protocol=WebSocketProtocol, workers=1)
 
 if __name__ == "__main__":
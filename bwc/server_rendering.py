@@ -1,4 +1,36 @@
-from bwc.objects import AreaFlag
+import json
+
+try:
+    # A much faster JSON encoder, used when it's installed
+    import orjson
+except ImportError:
+    orjson = None
+
+from bwc.objects import DISCARD_AREA, DRAW_AREA, HAND_AREA, PLAY_AREA, AreaFlag
+
+# The CSS classes of each kind of area
+AREA_CLASSES = ((PLAY_AREA, " playArea"), (DRAW_AREA, " drawArea"), (HAND_AREA, " handArea"),
+                (DISCARD_AREA, " discardArea"))
+
+# Area.flag_bits => the area's CSS classes, filled in as they come up
+_area_classes = {}
+
+# Bumped whenever the structured "state" messages change shape, so clients know what they are
+# reading.  See area_state and game_state
+STATE_VERSION = 1
+
+# Area.flag_bits => the names of the area's flags, filled in as they come up
+_area_flag_names = {}
+
+
+if orjson is not None:
+    def dumps(data) -> str:
+        """
+        JSON-encode data, with orjson if it's installed and the json module otherwise
+        """
+        return orjson.dumps(data).decode()
+else:
+    dumps = json.dumps
 
 
 def format_card(index, card):
@@ -15,8 +47,17 @@ def format_score(score):
     return f"<span class=\"tag score {'negative-score' if score < 0 else 'non-negative-score'}\">({score} points)</span>"
 
 
+def area_classes(flag_bits):
+    try:
+        return _area_classes[flag_bits]
+    except KeyError:
+        pass
+    classes = _area_classes[flag_bits] = "area" + "".join(name for bit, name in AREA_CLASSES if flag_bits & bit)
+    return classes
+
+
 def format_area_id(area):
-    classes = "area"
+    classes = area_classes(area.flag_bits)
     area_id = area.id
 
     if '.' in area_id:
@@ -25,24 +66,26 @@ def format_area_id(area):
         second = area_id[dot_loc:]
         area_id = f'{format_player(first)}{second}'
 
-    if AreaFlag.PLAY_AREA in area.flags:
-        classes += " playArea"
-    if AreaFlag.DRAW_AREA in area.flags:
-        classes += " drawArea"
-    if AreaFlag.HAND_AREA in area.flags:
-        classes += " handArea"
-    if AreaFlag.DISCARD_AREA in area.flags:
-        classes += " discardArea"
-
     return f'<span data-area_id="{area.id}" class="{classes}">{area_id}</span>'
 
 
-def format_area(engine, player, area):
-    can_look, area_contents = engine.kernel.look_at(player, area)
+def area_score(engine, area, scoreboard=None):
+    if scoreboard is not None and area in scoreboard.areas:
+        return scoreboard.areas[area]
+    return engine.kernel.score_area(area)
+
+
+def format_area(engine, player, area, scoreboard=None, looked=None):
+    """
+    Render an area the way a player sees it
+
+    :param looked: what engine.kernel.look_at(player, area) returned, if it was already asked
+    """
+    can_look, area_contents = engine.kernel.look_at(player, area) if looked is None else looked
     if can_look:
         output = f"{format_area_id(area)} "
-        if AreaFlag.PLAY_AREA in area.flags:
-            output += format_score(engine.kernel.score_area(area))
+        if area.flag_bits & PLAY_AREA:
+            output += format_score(area_score(engine, area, scoreboard))
         else:
             output += "<span class=\"tag visible\">(visible)</span>"
         output += "\n"
@@ -54,4 +97,117 @@ def format_area(engine, player, area):
         output = output[:-1]
     else:
         output = f"{format_area_id(area)} <span class=\"tag card-count\">({area_contents} cards)</span>"
-    return f"<span ondrop='drop_handler(\"{area.id}\", event)' ondragover='dragover_handler(event)'>{output}</span>"
+    # data-area_block lets the client swap out just this area when it changes, see send_update
+    return f"<span data-area_block=\"{area.id}\" ondrop='drop_handler(\"{area.id}\", event)' " \
+           f"ondragover='dragover_handler(event)'>{output}</span>"
+
+
+def area_flag_names(flag_bits):
+    try:
+        return _area_flag_names[flag_bits]
+    except KeyError:
+        pass
+    names = _area_flag_names[flag_bits] = [flag.name for flag in AreaFlag if flag_bits & flag.bit]
+    return names
+
+
+def area_state(engine, player, area, scoreboard=None, looked=None):
+    """
+    An area the way a player sees it, as data for the client to render; the structured
+    counterpart of format_area.  Cards are [id, name] pairs in order, so a card's index is its
+    position plus one.  Areas the player can't look at only have a card count
+
+    :param looked: what engine.kernel.look_at(player, area) returned, if it was already asked
+    """
+    can_look, area_contents = engine.kernel.look_at(player, area) if looked is None else looked
+    state = {
+        "id": area.id,
+        "flags": area_flag_names(area.flag_bits),
+        "visible": can_look,
+    }
+    if can_look:
+        state["cards"] = [[card._uuid, card.name] for card in area_contents]
+        if area.flag_bits & PLAY_AREA:
+            state["score"] = area_score(engine, area, scoreboard)
+    else:
+        state["count"] = area_contents
+    return state
+
+
+def game_state(engine, player, scoreboard=None, looks=None, final=False):
+    """
+    The whole game the way a player sees it, as a "state" message
+
+    :param looks: (area, what look_at returned) for every area, if they were already looked at
+    :param final: whether the game is over, which adds every player's score
+    """
+    if scoreboard is None:
+        scoreboard = engine.kernel.score_all()
+    if looks is None:
+        looks = [(area, None) for area in engine.game.all_areas.values()]
+
+    state = {
+        "type": "state",
+        "version": STATE_VERSION,
+        "areas": [area_state(engine, player, area, scoreboard, looked) for area, looked in looks],
+    }
+    if final:
+        state["final"] = True
+        state["players"] = [[scored_player.username, scoreboard.players[scored_player]]
+                            for scored_player in engine.game.players.values()]
+    return state
+
+
+def area_signature(engine, area, looked, scoreboard=None):
+    """
+    Everything about how an area looks to a player that can change: the version of its
+    contents, whether the player can look at it and, if they can and it's a play area, its
+    score.  Players for whom this is the same see the area the same way
+
+    :param looked: what engine.kernel.look_at(player, area) returned
+    """
+    score = area_score(engine, area, scoreboard) if looked[0] and area.flag_bits & PLAY_AREA else None
+    return engine.kernel.area_version(area), looked[0], score
+
+
+def encode_message(fields, encoded_fields):
+    """
+    dumps(fields), plus more fields whose values are already JSON-encoded
+    """
+    encoded = dumps(fields)
+    if not encoded_fields:
+        return encoded
+    extra = ", ".join(f"{dumps(key)}: {value}" for key, value in encoded_fields.items())
+    return f"{encoded[:-1]}{', ' if fields else ''}{extra}}}"
+
+
+class RenderCache():
+    """
+    Areas that were already rendered and JSON-encoded for one player, kept to reuse for every
+    other player who sees them the same way, so public areas are only rendered once per update.
+    Entries are keyed by area id and area_signature, which only hold for one version of the game
+    """
+    def __init__(self, version=None):
+        self.version = version
+        # (area id, signature) => format_area, encoded as the inside of a JSON string
+        self.html = dict()
+        # (area id, signature) => area_state, encoded as JSON
+        self.state = dict()
+
+    def area_html(self, engine, player, area, scoreboard, looked, signature):
+        key = (area.id, signature)
+        try:
+            return self.html[key]
+        except KeyError:
+            pass
+        encoded = self.html[key] = dumps(format_area(engine, player, area, scoreboard, looked))[1:-1]
+        return encoded
+
+    def area_state(self, engine, player, area, scoreboard, looked, signature):
+        key = (area.id, signature)
+        try:
+            return self.state[key]
+        except KeyError:
+            pass
+        encoded = self.state[key] = dumps(area_state(engine, player, area, scoreboard, looked))
+        return encoded
@@ -0,0 +1,359 @@
+"""
+Plays complete games without the server, with bots in every seat.
+
+    python -m bwc.simulate --games 100 --players 4 --policy random --policy greedy
+
+Bots play through Engine and Kernel exactly like the server's players do: they can only
+try to move cards and end their turn, and the kernel decides what's allowed.
+"""
+from abc import ABC, abstractmethod
+import argparse
+import asyncio
+import io
+import random
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bwc.engine import Engine
+from bwc.objects import HAND_AREA, PLAY_AREA, Area, Card, Player
+
+# A move a bot can try: move the card from the first area to the second
+Move = Tuple[Card, Area, Area]
+
+# Most moves a bot tries to make in one turn, in case cards let it keep playing forever
+MAX_MOVES_PER_TURN = 20
+
+
+class Bot(ABC):
+    """
+    Decides what a simulated player does.  Bots don't need to know the rules: they rank every
+    move they could try, the simulator tries them in that order and makes the first one the
+    kernel allows.
+    """
+    name = 'bot'
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    @abstractmethod
+    def order_moves(self, engine: Engine, player: Player, moves: List[Move]) -> List[Move]:
+        """
+        Rank the moves the player could try, best first
+
+        :param engine: the game being played
+        :param player: the player whose move it is
+        :param moves: every move the player could try, whether or not it's allowed
+        :return: the moves to try, in order
+        """
+
+    def choose(self, engine: Engine, player: Player, choices: List[str]) -> str:
+        """
+        Answer a card's get_player_input prompt
+
+        :return: one of choices
+        """
+        return self.rng.choice(choices)
+
+
+class RandomBot(Bot):
+    """
+    Makes a random allowed move; trying moves in a random order makes every allowed move
+    equally likely to be the first one that goes through
+    """
+    name = 'random'
+
+    def order_moves(self, engine, player, moves):
+        moves = moves[:]
+        self.rng.shuffle(moves)
+        return moves
+
+
+class GreedyBot(Bot):
+    """
+    Makes the move that gains it the most points over the other players: it plays its highest
+    scoring cards to its own play area and its lowest scoring cards to other players' play areas,
+    and only draws instead when no play would gain it anything
+    """
+    name = 'greedy'
+
+    def order_moves(self, engine, player, moves):
+        def worth(card, area):
+            # What a card in an area is worth to the player
+            if not area.flag_bits & PLAY_AREA:
+                return 0
+            if player not in area.owners:
+                return -engine.kernel.score_card(card)
+            if len(area.owners) == 1:
+                return engine.kernel.score_card(card)
+            # Shared areas count for everyone
+            return 0
+
+        def gain(move):
+            card, from_area, to_area = move
+            return worth(card, to_area) - worth(card, from_area)
+
+        moves = moves[:]
+        self.rng.shuffle(moves)  # break ties randomly
+        return sorted(moves, key=gain, reverse=True)
+
+
+POLICIES: Dict[str, Callable[[random.Random], Bot]] = {
+    RandomBot.name: RandomBot,
+    GreedyBot.name: GreedyBot,
+}
+
+
+class GameResult:
+    def __init__(self):
+        self.scores: Dict[str, int] = {}  # username => final score
+        self.winners: List[str] = []
+        self.turns: int = 0
+        self.moves: int = 0  # moves the kernel allowed
+        self.attempts: int = 0  # moves the bots tried
+        self.choices: int = 0  # get_player_input prompts answered
+        self.stuck_turns: int = 0  # turns that only ended because the bot ran out of options
+        self.errors: List[str] = []  # where the game crashed, for every crash the simulator played through
+        self.plays: List[Tuple[str, str]] = []  # (card class, username) for every card a player played from their hand
+        self.card_scores: List[Tuple[str, int]] = []  # (card class, final score) for every card in play at the end
+
+    def crashed(self, error: Exception):
+        """
+        Record an exception that escaped the kernel, by the line of code that raised it
+        """
+        frame = traceback.extract_tb(error.__traceback__)[-1]
+        self.errors.append(f"{frame.filename.rsplit('/', 1)[-1]}:{frame.lineno} {type(error).__name__}")
+
+
+class Simulator:
+    """
+    Runs games with bots in every seat
+
+    :param policies: the bot policy of each seat, by name (see POLICIES)
+    :param seed: seeds the bots and the deck, so a run can be repeated
+    :param max_turns: games that haven't ended by then are ended by the simulator, like games
+    whose draw pile ran out
+    :param hook_timings: if given, the time spent in every card handler is added to it,
+    see Kernel.time_hooks
+    """
+
+    def __init__(self, policies: List[str], seed: Optional[int] = None, gamerounds: int = 5, handsize: int = 5,
+                 max_turns: int = 200, hook_timings: Optional[Dict[Tuple[str, str], List]] = None):
+        self.policies = policies
+        self.rng = random.Random(seed)
+        self.gamerounds = gamerounds
+        self.handsize = handsize
+        self.max_turns = max_turns
+        self.hook_timings = hook_timings
+
+    def run(self, games: int) -> List[GameResult]:
+        """
+        Play some games, one after the other
+        """
+        return asyncio.run(self.__run(games))
+
+    async def __run(self, games: int) -> List[GameResult]:
+        # Cards print their errors and warnings, and the kernel prints the tracebacks of cards
+        # that crashed; nobody is watching a simulation
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            return [await self.play_game() for _ in range(games)]
+
+    async def play_game(self) -> GameResult:
+        """
+        Play a single game to the end.  Needs a running event loop, since the kernel hands
+        messages and player input prompts to it.
+        """
+        result = GameResult()
+        bots = {}
+
+        async def send_message(players, message):
+            pass
+
+        async def get_player_input(player, choices, callback):
+            result.choices += 1
+            try:
+                callback(bots[player.username].choose(engine, player, choices))
+            except Exception as e:
+                result.crashed(e)
+
+        engine = Engine()
+        engine.reset(send_message, get_player_input)
+        for seat, policy in enumerate(self.policies):
+            username = f'{policy}{seat}'
+            engine.add_player(username)
+            bots[username] = POLICIES[policy](random.Random(self.rng.getrandbits(64)))
+        if self.hook_timings is not None:
+            engine.kernel.time_hooks(self.hook_timings)
+        engine.setup_game(self.gamerounds, self.handsize, self.rng.getrandbits(64))
+
+        while not engine.is_game_over() and result.turns < self.max_turns:
+            player = engine.game.current_player
+            if not engine.game.draw.contents:
+                # The deck is sized for the number of rounds, and without drawing
+                # nobody can end their turn anymore
+                break
+            await self.__play_turn(engine, player, bots, result)
+            result.turns += 1
+            await self.__attempt(result, engine.advance_turn)
+
+        if not engine.is_game_over():
+            await self.__attempt(result, engine.kernel.end_game)
+
+        for card, score in engine.kernel.score_all().cards.items():
+            result.card_scores.append((type(card).__name__, score))
+        for player, is_winner, score in engine.kernel.find_winners():
+            result.scores[player.username] = score
+            if is_winner:
+                result.winners.append(player.username)
+        return result
+
+    async def __play_turn(self, engine: Engine, player: Player, bots: Dict[str, Bot], result: GameResult):
+        """
+        Let the current player make their moves and end their turn.  Some cards keep the turn
+        from ending until the other players did something, so they get to move too if needed.
+        """
+        await self.__make_moves(engine, player, bots[player.username], result)
+        for _ in range(MAX_MOVES_PER_TURN):
+            if engine.is_game_over() or await self.__attempt(result, engine.kernel.end_turn, player):
+                return
+            moved = False
+            for other in engine.game.players.values():
+                if other is not player:
+                    moved |= await self.__make_moves(engine, other, bots[other.username], result)
+            if not moved:
+                break
+        # The server would wait for the player forever, move on instead
+        result.stuck_turns += 1
+
+    async def __make_moves(self, engine: Engine, player: Player, bot: Bot, result: GameResult) -> bool:
+        """
+        Have a player make moves until the kernel doesn't allow any of the moves the bot tries
+
+        :return: whether the player moved at all
+        """
+        moved = False
+        for _ in range(MAX_MOVES_PER_TURN):
+            for card, from_area, to_area in bot.order_moves(engine, player, self.__moves(engine, player)):
+                result.attempts += 1
+                if await self.__attempt(result, engine.kernel.move_card, player, card, from_area, to_area):
+                    result.moves += 1
+                    if from_area.flag_bits & HAND_AREA and to_area.flag_bits & PLAY_AREA:
+                        result.plays.append((type(card).__name__, player.username))
+                    moved = True
+                    break
+            else:
+                # Nothing the bot tried was allowed
+                break
+            if engine.is_game_over():
+                break
+        return moved
+
+    async def __attempt(self, result: GameResult, action: Callable, *args):
+        """
+        Have the kernel do something and wait for whatever it started to finish.
+        A card crashing in the middle is recorded, and the game goes on like it would on the server.
+
+        :return: what the action returned, or None if it crashed
+        """
+        try:
+            outcome = action(*args)
+        except Exception as e:
+            result.crashed(e)
+            outcome = None
+        await self.__settle()
+        return outcome
+
+    @staticmethod
+    def __moves(engine: Engine, player: Player) -> List[Move]:
+        """
+        Every move a player might be able to make: drawing a card, playing or discarding a
+        card from their hand, or discarding a card from their play area
+        """
+        game = engine.game
+        moves = []
+        if game.draw.contents:
+            moves.append((game.draw.contents[0], game.draw, player.hand))
+        to_areas = [area for area in game.all_areas.values() if area.flag_bits & PLAY_AREA]
+        to_areas.append(game.discard)
+        for card in player.hand.contents:
+            for area in to_areas:
+                moves.append((card, player.hand, area))
+        for card in player.area.contents:
+            moves.append((card, player.area, game.discard))
+        return moves
+
+    @staticmethod
+    async def __settle():
+        """
+        Let the kernel's message and player input tasks run to completion, including any
+        prompts the answers to those prompts caused
+        """
+        current = asyncio.current_task()
+        while any(task is not current and not task.done() for task in asyncio.all_tasks()):
+            await asyncio.sleep(0)
+
+
+def format_report(results: List[GameResult], seconds: float, hook_timings: Optional[Dict] = None,
+                  top: int = 15) -> str:
+    games = len(results)
+    moves = sum(result.moves for result in results)
+    turns = sum(result.turns for result in results)
+    attempts = sum(result.attempts for result in results)
+    lines = [
+        f"{games} games, {turns} turns, {moves} moves ({attempts} tried) in {seconds:.2f}s",
+        f"{games / seconds:.1f} games/s, {moves / seconds:.1f} moves/s, {attempts / seconds:.1f} tries/s",
+    ]
+    stuck = sum(result.stuck_turns for result in results)
+    if stuck:
+        lines.append(f"{stuck} turns could not be ended normally")
+
+    wins = {}
+    for result in results:
+        for winner in result.winners:
+            wins[winner] = wins.get(winner, 0) + 1
+    lines.append("wins: " + ", ".join(f"{seat} {count}" for seat, count in sorted(wins.items())))
+
+    errors = {}
+    for result in results:
+        for error in result.errors:
+            errors[error] = errors.get(error, 0) + 1
+    if errors:
+        lines.append(f"{sum(errors.values())} card crashes:")
+        for error, count in sorted(errors.items(), key=lambda item: item[1], reverse=True)[:top]:
+            lines.append(f"  {count:>6} {error}")
+
+    if hook_timings:
+        lines.append("")
+        lines.append(f"{'card':<32} {'handler':<24} {'calls':>8} {'total ms':>10} {'us/call':>8}")
+        ranked = sorted(hook_timings.items(), key=lambda item: item[1][1], reverse=True)
+        for (card, handler), (calls, elapsed) in ranked[:top]:
+            lines.append(f"{card:<32} {handler:<24} {calls:>8} {elapsed * 1000:>10.2f} {elapsed / calls * 1e6:>8.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play games between bots, without the server")
+    parser.add_argument('-n', '--games', type=int, default=100, help="number of games to play")
+    parser.add_argument('-p', '--players', type=int, default=4, help="number of players per game")
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help="bot policy of each seat, repeated for every seat; the last one fills the rest")
+    parser.add_argument('--seed', type=int, default=None, help="seed, to repeat a run")
+    parser.add_argument('--gamerounds', type=int, default=5)
+    parser.add_argument('--handsize', type=int, default=5)
+    parser.add_argument('--max-turns', type=int, default=200, help="end games that take longer than this")
+    parser.add_argument('--no-timings', action='store_true', help="don't time the cards' handlers")
+    args = parser.parse_args(argv)
+
+    policies = args.policy or [RandomBot.name]
+    policies = (policies + [policies[-1]] * args.players)[:args.players]
+    hook_timings = None if args.no_timings else {}
+
+    simulator = Simulator(policies, args.seed, args.gamerounds, args.handsize, args.max_turns, hook_timings)
+    start = perf_counter()
+    results = simulator.run(args.games)
+    print(format_report(results, perf_counter() - start, hook_timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Plays lots of games between bots on every core, and collects statistics about every card.
+
+    python -m bwc.tournament --games 100000 --workers 32 --csv cards.csv --json cards.json
+
+The games are split into shards, and every shard gets its own seed drawn from the tournament's
+seed, so a tournament can be repeated no matter how many workers play it.  Workers only send
+back their totals, so they spend their time playing rather than talking to each other.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter, process_time
+from typing import Dict, List, Optional
+
+from bwc.simulate import POLICIES, GameResult, RandomBot, Simulator
+
+# Games per shard, unless asked otherwise; small enough to keep every worker busy until the end
+SHARD_SIZE = 25
+
+# Columns of the CSV file, one row per card class
+CSV_FIELDS = ['card', 'plays', 'wins', 'win_rate', 'in_play', 'average_score', 'hook_calls', 'hook_ms']
+
+
+class CardStats:
+    """
+    Totals for one card class over many games
+    """
+
+    def __init__(self):
+        self.plays: int = 0  # times a player played the card from their hand
+        self.wins: int = 0  # times the player who played it won the game
+        self.in_play: int = 0  # times the card was in play at the end of a game
+        self.score_total: int = 0  # what it scored at the end of those games, added up
+        self.hook_calls: int = 0  # calls to the card's handlers
+        self.hook_seconds: float = 0.0  # time spent in the card's handlers
+
+    @property
+    def win_rate(self) -> Optional[float]:
+        return self.wins / self.plays if self.plays else None
+
+    @property
+    def average_score(self) -> Optional[float]:
+        return self.score_total / self.in_play if self.in_play else None
+
+    def merge(self, other: 'CardStats'):
+        self.plays += other.plays
+        self.wins += other.wins
+        self.in_play += other.in_play
+        self.score_total += other.score_total
+        self.hook_calls += other.hook_calls
+        self.hook_seconds += other.hook_seconds
+
+    def as_dict(self) -> dict:
+        return {
+            'plays': self.plays,
+            'wins': self.wins,
+            'win_rate': self.win_rate,
+            'in_play': self.in_play,
+            'average_score': self.average_score,
+            'hook_calls': self.hook_calls,
+            'hook_ms': self.hook_seconds * 1000,
+        }
+
+
+class TournamentResult:
+    """
+    Totals over many games; the results of shards are merged into one of these
+    """
+
+    def __init__(self):
+        self.games: int = 0
+        self.turns: int = 0
+        self.moves: int = 0
+        self.cpu_seconds: float = 0.0  # time the workers spent playing, added up
+        self.wins: Dict[str, int] = {}  # seat => games won
+        self.crashes: Dict[str, int] = {}  # where cards crashed => times it happened
+        self.cards: Dict[str, CardStats] = {}  # card class => its totals
+
+    def card(self, name: str) -> CardStats:
+        stats = self.cards.get(name)
+        if stats is None:
+            stats = self.cards[name] = CardStats()
+        return stats
+
+    def add_game(self, result: GameResult):
+        self.games += 1
+        self.turns += result.turns
+        self.moves += result.moves
+        for winner in result.winners:
+            self.wins[winner] = self.wins.get(winner, 0) + 1
+        for error in result.errors:
+            self.crashes[error] = self.crashes.get(error, 0) + 1
+        for name, username in result.plays:
+            stats = self.card(name)
+            stats.plays += 1
+            stats.wins += username in result.winners
+        for name, score in result.card_scores:
+            stats = self.card(name)
+            stats.in_play += 1
+            stats.score_total += score
+
+    def add_hook_timings(self, timings: Dict):
+        for (name, handler), (calls, elapsed) in timings.items():
+            stats = self.card(name)
+            stats.hook_calls += calls
+            stats.hook_seconds += elapsed
+
+    def merge(self, other: 'TournamentResult'):
+        self.games += other.games
+        self.turns += other.turns
+        self.moves += other.moves
+        self.cpu_seconds += other.cpu_seconds
+        for seat, wins in other.wins.items():
+            self.wins[seat] = self.wins.get(seat, 0) + wins
+        for error, count in other.crashes.items():
+            self.crashes[error] = self.crashes.get(error, 0) + count
+        for name, stats in other.cards.items():
+            self.card(name).merge(stats)
+
+    def as_dict(self) -> dict:
+        return {
+            'games': self.games,
+            'turns': self.turns,
+            'moves': self.moves,
+            'cpu_seconds': self.cpu_seconds,
+            'wins': self.wins,
+            'crashes': self.crashes,
+            'cards': {name: self.cards[name].as_dict() for name in sorted(self.cards)},
+        }
+
+
+def play_shard(policies: List[str], seed: int, games: int, gamerounds: int = 5, handsize: int = 5,
+               max_turns: int = 200) -> TournamentResult:
+    """
+    Play some of a tournament's games, and total them up.  Runs in a worker process.
+    """
+    start = process_time()
+    timings = {}
+    simulator = Simulator(policies, seed, gamerounds, handsize, max_turns, timings)
+    total = TournamentResult()
+    for result in simulator.run(games):
+        total.add_game(result)
+    total.add_hook_timings(timings)
+    total.cpu_seconds = process_time() - start
+    return total
+
+
+def run_tournament(games: int, policies: List[str], workers: Optional[int] = None, seed: Optional[int] = None,
+                   shards: Optional[int] = None, **options) -> TournamentResult:
+    """
+    Play games between bots on several processes at once
+
+    :param games: how many games to play
+    :param policies: the bot policy of each seat, see simulate.POLICIES
+    :param workers: how many processes to use, every core by default; 1 plays in this process
+    :param seed: seeds the whole tournament
+    :param shards: how many pieces to split the games into; SHARD_SIZE games each by default,
+    so the workers finish at about the same time.  The shards decide the games' seeds, the
+    number of workers doesn't
+    :param options: passed on to the Simulator (gamerounds, handsize, max_turns)
+    :return: the totals of all the games
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if shards is None:
+        shards = -(-games // SHARD_SIZE)
+    shards = max(1, min(shards, games))
+
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(shards)]
+    sizes = [games // shards + (shard < games % shards) for shard in range(shards)]
+
+    total = TournamentResult()
+    if workers == 1:
+        for shard_seed, size in zip(seeds, sizes):
+            total.merge(play_shard(policies, shard_seed, size, **options))
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_shard, policies, shard_seed, size, **options)
+                   for shard_seed, size in zip(seeds, sizes)]
+        for future in futures:
+            total.merge(future.result())
+    return total
+
+
+def write_csv(result: TournamentResult, path: str):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, CSV_FIELDS)
+        writer.writeheader()
+        for name in sorted(result.cards):
+            writer.writerow(dict(result.cards[name].as_dict(), card=name))
+
+
+def write_json(result: TournamentResult, path: str):
+    with open(path, 'w') as f:
+        json.dump(result.as_dict(), f, indent=2)
+
+
+def format_report(result: TournamentResult, seconds: float, top: int = 15) -> str:
+    lines = [
+        f"{result.games} games, {result.turns} turns, {result.moves} moves in {seconds:.2f}s "
+        f"({result.cpu_seconds:.2f}s of worker time)",
+        f"{result.games / seconds:.1f} games/s, {result.moves / seconds:.1f} moves/s",
+        "wins: " + ", ".join(f"{seat} {count}" for seat, count in sorted(result.wins.items())),
+    ]
+    if result.crashes:
+        lines.append(f"{sum(result.crashes.values())} card crashes")
+
+    played = [(name, stats) for name, stats in result.cards.items() if stats.plays]
+    played.sort(key=lambda item: item[1].win_rate, reverse=True)
+    lines.append("")
+    lines.append(f"{'card':<32} {'plays':>8} {'win rate':>8} {'avg score':>10} {'hook ms':>10}")
+    for name, stats in played[:top]:
+        average_score = '-' if stats.average_score is None else f"{stats.average_score:.1f}"
+        lines.append(f"{name:<32} {stats.plays:>8} {stats.win_rate:>8.3f} {average_score:>10} "
+                     f"{stats.hook_seconds * 1000:>10.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play lots of games between bots and collect card statistics")
+    parser.add_argument('-n', '--games', type=int, default=1000, help="number of games to play")
+    parser.add_argument('-p', '--players', type=int, default=4, help="number of players per game")
+    parser.add_argument('--policy', action='append', choices=sorted(POLICIES),
+                        help="bot policy of each seat, repeated for every seat; the last one fills the rest")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="number of processes, every core by default")
+    parser.add_argument('--shards', type=int, default=None, help="number of pieces to split the games into")
+    parser.add_argument('--seed', type=int, default=None, help="seed, to repeat a tournament")
+    parser.add_argument('--gamerounds', type=int, default=5)
+    parser.add_argument('--handsize', type=int, default=5)
+    parser.add_argument('--max-turns', type=int, default=200, help="end games that take longer than this")
+    parser.add_argument('--csv', help="write the card statistics to this CSV file")
+    parser.add_argument('--json', help="write all the statistics to this JSON file")
+    args = parser.parse_args(argv)
+
+    policies = args.policy or [RandomBot.name]
+    policies = (policies + [policies[-1]] * args.players)[:args.players]
+
+    start = perf_counter()
+    result = run_tournament(args.games, policies, args.workers, args.seed, args.shards, gamerounds=args.gamerounds,
+                            handsize=args.handsize, max_turns=args.max_turns)
+    print(format_report(result, perf_counter() - start))
+    if args.csv:
+        write_csv(result, args.csv)
+    if args.json:
+        write_json(result, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,124 +1,321 @@
-import inspect
 import re
 from os.path import abspath, dirname, join
-from random import choice
-from typing import List
+from random import Random
+from types import MemberDescriptorType
+from typing import Dict, Iterable, List, Set
+from weakref import WeakKeyDictionary
 
 # Root directory of the module
 MODULE_ROOT = dirname(abspath(__file__))
 
 
+# Attributes that every Proxy class defines itself, instead of taking them over from the proxied class
+_PROXY_OWN_ATTRS = frozenset({'__new__', '__getattr__', '__getattribute__', '__setattr__', '__getitem__', '__setitem__',
+                              '__repr__', '__str__', '__init__', '__slots__', '__dict__', '__weakref__', '__module__',
+                              '__qualname__', '__doc__', '_proxy_class', '_proxy_methods'})
+
+# Class-level callables that must not be bound to the backing object
+_CLASS_CALLABLE_TYPES = (staticmethod, classmethod, type(vars(dict)['fromkeys']))
+
+# type => method table, for types we can't hang the table off of (builtins)
+_method_tables = {}
+
+
+def _method_proxy(method):
+    """
+    Wrap a method so it is called on a proxy's backing object and its result is immutablized
+    """
+    # Callables require a bit more work - in the case of builtins, they _require_ that
+    # the actual backing object be passed as the first argument (? maybe not?  But that seems to fix the errors so idk)
+    def mproxy(self, *args, **kwargs):
+        if isinstance(type(self), MetaFactory):
+            return _rewrap(self, method(object.__getattribute__(self, "_backing_obj"), *args, **kwargs))
+        else:
+            return immutablize(method(self, *args, **kwargs))
+    return mproxy
+
+
+def _slot_proxy(attr):
+    """
+    Read a slot of a proxy's backing object.  Without this, reading a slot through a proxy
+    would find the proxy's own (empty) slot first, and only get to __getattr__ by way of an
+    AttributeError.
+    """
+    def sproxy(self):
+        return _rewrap(self, getattr(object.__getattribute__(self, "_backing_obj"), attr))
+    return property(sproxy)
+
+
+def _method_table(klass):
+    """
+    Get the attributes a Proxy class takes over from the attributes defined directly on klass,
+    with methods wrapped by _method_proxy.  The table is built once per class and shared by the
+    Proxy classes of all of its subclasses.
+    """
+    try:
+        return vars(klass)['_proxy_methods']
+    except KeyError:
+        pass
+    if klass in _method_tables:
+        return _method_tables[klass]
+
+    table = {}
+    for attr, val in vars(klass).items():
+        if attr in _PROXY_OWN_ATTRS:
+            continue
+        if isinstance(val, MemberDescriptorType):
+            table[attr] = _slot_proxy(attr)
+        elif not callable(val) or isinstance(val, _CLASS_CALLABLE_TYPES):
+            # Normal, non-callable attributes can just be proxied as-is.
+            table[attr] = val
+        else:
+            table[attr] = _method_proxy(val)
+    try:
+        type.__setattr__(klass, '_proxy_methods', table)
+    except TypeError:
+        _method_tables[klass] = table
+    return table
+
+
 class MetaFactory(type):
     def __new__(mcs, name, bases, attrs):
         # There will _always_ only be one base class - the proxied object's class.
         base = bases[0]
-        # These are the attributes from Proxy() that we want to have override the parent class.
-        whitelist = ['__new__', '__getattr__', '__getattribute__', '__setattr__', '__getitem__', '__setitem__',
-                     '__repr__', '__str__', '__init__']
-        for attr, val in inspect.getmembers(base):
-            if attr not in whitelist:
-                if not hasattr(val, '__call__'):
-                    # Normal, non-callable attributes can just be proxied as-is.
-                    # print(f'Normal-proxying attr {attr}')
-                    attrs[attr] = val
-                else:
-                    # Callables require a bit more work - in the case of builtins, they _require_ that
-                    # the actual backing object be passed as the first argument (? maybe not?  But that seems to fix the errors so idk)
-                    # print(f"Call-proxying attr {attr}")
-
-                    def proxy_wrapper(attr_name):
-                        # We need the outer proxy_wrapper to make sure the value of attr_name gets preserved in the closure.
-                        def mproxy(self, *args, **kwargs):
-                            if isinstance(type(self), MetaFactory):
-                                # print(f"PROXYING {attr_name}")
-                                return immutablize(
-                                    getattr(base, attr_name)(self._backing_obj, *args, **kwargs))
-                            else:
-                                # print(f"SUPER TRANSPARENT PROXYING {self} {attr_name}")
-                                # print(f'{args}')
-                                return immutablize(getattr(base, attr_name)(self, *args, **kwargs))
-
-                        return mproxy
-
-                    attrs[attr] = proxy_wrapper(attr)
+        # Walk the class hierarchy ourselves, most derived class last so its attributes win.
+        # This only looks at the class dicts, instead of getattr-ing every member like
+        # inspect.getmembers would.
+        for klass in reversed(base.__mro__):
+            attrs.update(_method_table(klass))
         name = base.__name__
         return super(MetaFactory, mcs).__new__(mcs, name, bases, attrs)
 
-    def __getattribute__(cls, attr):
-        # print(f'mcls {attr}')
-        return super().__getattribute__(attr)
 
+# type => Optional[Proxy class], for types we can't hang the proxy class off of (builtins)
+# if proxy class is None, then it can't be immutablized.  Weak, so it never keeps a type around
+_cls_cache = WeakKeyDictionary()
+
+# Types whose instances can't be changed anyway, so they never need a proxy
+_IMMUTABLE_TYPES = frozenset({type(None), bool, int, float, complex, str, bytes, frozenset, range})
+
+
+def _make_proxy_class(target_type):
+    """
+    Build the immutable Proxy class for a type
+
+    :return: the Proxy class, or None if the type can't be proxied
+    """
+    def __init__(self, obj, views=None):
+        object.__setattr__(self, "_backing_obj", obj)
+        object.__setattr__(self, "_views", views)
+
+    def __getattr__(self, attr):
+        backing = object.__getattribute__(self, "_backing_obj")
+        if attr == "_backing_obj":
+            return backing
+        return _rewrap(self, getattr(backing, attr))
+
+    def __setattr__(self, attr, val):
+        raise AttributeError("Error: Card attempted to change gamestate without kernel call!")
+
+    def __getitem__(self, attr):
+        return _rewrap(self, object.__getattribute__(self, "_backing_obj")[attr])
 
-# id(type(target)) => Optional[Proxy class]
-# if proxy class is None, then it can't be immutablized
-_cls_cache = {}
+    def __setitem__(self, attr, val):
+        raise AttributeError("Error: Card attempted to manipulate state without kernel call!")
 
+    def __repr__(self):
+        return repr(object.__getattribute__(self, "_backing_obj"))
 
-def immutablize(target):
+    def __str__(self):
+        return str(object.__getattribute__(self, "_backing_obj"))
+
+    attrs = {'__init__': __init__, '__getattr__': __getattr__, '__setattr__': __setattr__,
+             '__getitem__': __getitem__, '__setitem__': __setitem__, '__repr__': __repr__, '__str__': __str__,
+             '__module__': target_type.__module__, '__qualname__': target_type.__qualname__}
+    try:
+        # Proxies only ever hold these two references, so give them slots when the type allows it
+        return MetaFactory('Proxy', (target_type,), dict(attrs, __slots__=('_backing_obj', '_views')))
+    except TypeError:
+        pass
+    try:
+        return MetaFactory('Proxy', (target_type,), attrs)
+    except TypeError:
+        # Failed to proxy, probably because the target was an unsubclassable base type
+        return None
+
+
+def proxy_class(target_type):
+    """
+    Get the immutable Proxy class for a type, building it the first time the type is seen.
+    The Proxy class is stored on the type itself when possible, so it is collected along
+    with the type; only builtin types end up in _cls_cache.
+
+    :return: the Proxy class, or None if the type can't be proxied
+    """
+    try:
+        return vars(target_type)['_proxy_class']
+    except KeyError:
+        pass
+    if target_type in _cls_cache:
+        return _cls_cache[target_type]
+
+    proxy = _make_proxy_class(target_type)
+    try:
+        type.__setattr__(target_type, '_proxy_class', proxy)
+    except TypeError:
+        _cls_cache[target_type] = proxy
+    return proxy
+
+
+def prepare_proxies(types):
+    """
+    Build the Proxy classes for some types ahead of time, so the first card to look at an
+    object of one of those types doesn't pay for it
+    """
+    for target_type in types:
+        if not isinstance(target_type, MetaFactory):
+            proxy_class(target_type)
+
+
+def _rewrap(proxy, value):
+    """
+    Immutablize a value read through a proxy, reusing the proxy's ViewCache if it has one
+    """
+    views = object.__getattribute__(proxy, "_views")
+    if views is not None:
+        return views.view(value)
+    return immutablize(value)
+
+
+def immutablize(target, views=None):
     """
     Given a target object, return an immutable proxy around it.
     Any attempts to set attributes on the returned object will
     raise an AttributeError with a descriptive error message.
     The original, mutable object can be accessed at ._backing_obj
     if necessary.
+    Values that are immutable to begin with (numbers, strings, ...) are returned as-is.
+    If views is given, anything read through the proxy is looked up in that ViewCache
+    instead of being wrapped in a brand new proxy.
     """
-    if target is None:
-        return None
+    if type(target) in _IMMUTABLE_TYPES:
+        return target
     if type(type(target)).__name__ == 'MetaFactory':  # it's already immutable
         return target
 
-    i = id(type(target))
-    if i in _cls_cache:
-        if _cls_cache[i] is not None:
-            return _cls_cache[i](target)
-        else:
-            return target
+    proxy = proxy_class(type(target))
+    if proxy is None:
+        return target
+    return proxy(target, views)
 
-    try:
-        class Proxy(type(target), metaclass=MetaFactory):
-            def __init__(self, obj):
-                # print("YEET PROXY INIT")
-                object.__setattr__(self, "_backing_obj", obj)
 
-            def __getattr__(self, attr):
-                # print(f"cls {attr}")
-                backing = object.__getattribute__(self, "_backing_obj")
-                if attr == "_backing_obj":
-                    return backing
-                return immutablize(getattr(backing, attr))
+class ViewCache:
+    """
+    Hands out read-only views of game objects (see immutablize), handing back the same view
+    every time it's asked about the same object.  Views don't copy anything, so they never go
+    stale; the owner clears the cache once the objects it holds on to may have left the game.
+
+    Only views of instances of shared_types are kept.  Everything else, like the lists a
+    method returns, gets a view of its own that goes away along with the object.
+    """
 
-            def __setattr__(self, attr, val):
-                raise AttributeError("Error: Card attempted to change gamestate without kernel call!")
+    def __init__(self, shared_types: Iterable[type] = ()):
+        # id(target) => view; the view keeps its target alive, so ids can't be reused
+        self._views = {}
+        self._shared_types = tuple(shared_types)
+        # type => whether views of its instances are kept, worked out once per type
+        self._shared = {}
 
-            def __getitem__(self, attr):
-                return immutablize(self._backing_obj[attr])
+    def view(self, target):
+        """
+        Get the read-only view of target, building it if this is the first time it's asked for
+        """
+        kind = type(target)
+        if kind in _IMMUTABLE_TYPES:
+            return target
+        try:
+            return self._views[id(target)]
+        except KeyError:
+            pass
+        view = immutablize(target, self)
+        shared = self._shared.get(kind)
+        if shared is None:
+            shared = self._shared[kind] = issubclass(kind, self._shared_types)
+        if shared:
+            self._views[id(target)] = view
+        return view
 
-            def __setitem__(self, attr, val):
-                raise AttributeError("Error: Card attempted to manipulate state without kernel call!")
+    def clear(self):
+        self._views = {}
 
-            def __repr__(self):
-                return repr(self._backing_obj)
 
-            def __str__(self):
-                return str(self._backing_obj)
+# The words ids are made of; loaded once, instead of every time an id is needed
+with open(join(MODULE_ROOT, 'words.txt'), 'r') as f:
+    WORDS = tuple(f.read().split())
 
-        out = Proxy(target)
-        _cls_cache[i] = Proxy
-        return out
-    except TypeError:
-        # Failed to proxy, probably because the target was an unsubclassable base type
-        _cls_cache[i] = None
-        return target
+# For ids made outside of any game; games use their own Game.rng
+_rng = Random()
 
 
-def random_id(disallowed: List[str] = None) -> str:
+def random_id(disallowed: List[str] = None, rng: Random = None) -> str:
     if disallowed is None:
         disallowed = []
-    with open(join(MODULE_ROOT, 'words.txt'), 'r') as f:
+    if rng is None:
+        rng = _rng
+    while True:
+        c = rng.choice(WORDS)
+        if c not in disallowed:
+            return c
+
+
+class IdAllocator:
+    """
+    Hands out ids that are unique within a game.  Ids that are already in use get a number
+    appended; the last number used for each id is remembered, so finding a free id doesn't
+    mean retrying every number from 1 again.
+    """
+
+    def __init__(self, taken: Iterable[str] = (), rng: Random = None):
+        self.taken: Set[str] = set(taken)  # ids in use
+        self.rng: Random = _rng if rng is None else rng  # picks the words of random ids
+        self._collisions: Dict[str, int] = {}  # id => the last number appended to it
+
+    def __contains__(self, item):
+        return item in self.taken
+
+    def unique(self, base: str = None) -> str:
+        """
+        Get an id that isn't in use yet, without reserving it
+
+        :param base: the preferred id; a random word if not given
+        :return: base if it is free, otherwise base with a number appended
+        """
+        if base is None:
+            base = self.rng.choice(WORDS)
+        if base not in self.taken:
+            return base
+        n = self._collisions.get(base, 0)
         while True:
-            c = choice(f.read().strip().split('\n'))
-            if c not in disallowed:
-                return c
+            n += 1
+            if f"{base}{n}" not in self.taken:
+                self._collisions[base] = n
+                return f"{base}{n}"
+
+    def reserve(self, id_: str):
+        """
+        Mark an id as in use
+        """
+        self.taken.add(id_)
+
+    def allocate(self, base: str = None) -> str:
+        """
+        Get an id that isn't in use yet, and reserve it
+
+        :param base: the preferred id; a random word if not given
+        """
+        id_ = self.unique(base)
+        self.reserve(id_)
+        return id_
 
 
 # Explanation: lowercase letters are the easiest to type quickly
@@ -103,7 +103,8 @@ function joinRoom(room_name, player_name) {
         }
 
         return (() => {
-            const call_path = addParamsToPath(JOIN_PATH, params);
+            // Ask for the structured game state, which we render ourselves
+            const call_path = addParamsToPath(JOIN_PATH, params) + "&protocol=state";
             
             // Xtreme hacks, referencing something in a global scope that hasn't been defined yet
             currentPlayerName = params.player_name;
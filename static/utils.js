@@ -4,6 +4,20 @@ const IMAGE_BASE_URL = "/cards/";
 let socket = false;
 let socket_connected = false;
 
+// Number of the last game state update we applied, so we can tell if we missed one
+let updateSeq = 0;
+
+// The version of the structured "state" messages we know how to render, see bwc/server_rendering.py
+const STATE_VERSION = 1;
+
+// CSS classes of each area flag, should match AREA_CLASSES in bwc/server_rendering.py
+const AREA_FLAG_CLASSES = {
+    "PLAY_AREA": " playArea",
+    "DRAW_AREA": " drawArea",
+    "HAND_AREA": " handArea",
+    "DISCARD_AREA": " discardArea"
+};
+
 // Automatically populate the websocket url with the correct value based on the current server
 function setupWSPath() {
     const SCHEME = window.location.protocol == "https:" ? "wss" : "ws";
@@ -139,10 +153,33 @@ function on_message(content) {
                 if (has_all(m, ["hand", "play"])) {
                     document.getElementById("hand-state").innerHTML = m.hand;
                     document.getElementById("play-state").innerHTML = m.play;
+                    updateSeq = m.seq || 0;
                 } else {
                     console.log("Update lacked hand or play: " + content);
                 }
                 break;
+            case "update_areas":
+                if (has_all(m, ["seq", "areas"])) {
+                    apply_area_updates(m.seq, m.areas);
+                } else {
+                    console.log("Area update lacked seq or areas: " + content);
+                }
+                break;
+            case "state":
+                if (has_all(m, ["version", "areas"]) && check_state_version(m)) {
+                    render_state(m);
+                    updateSeq = m.seq || 0;
+                } else {
+                    console.log("Unusable state: " + content);
+                }
+                break;
+            case "state_areas":
+                if (has_all(m, ["version", "seq", "areas"]) && check_state_version(m)) {
+                    apply_area_updates(m.seq, m.areas.map((area) => ({"id": area.id, "html": render_area(area)})));
+                } else {
+                    console.log("Unusable area state: " + content);
+                }
+                break;
             case "inspect":
                 if (has_all(m, ["url", "title", "value", "flags", "tags"])) {
                     document.getElementById("inspect-image").src = IMAGE_BASE_URL + m.url;
@@ -168,6 +205,119 @@ function on_message(content) {
     }
 }
 
+// Swap in the areas that changed since the last update, given as a list of {id, html}.  If we
+// missed an update, or don't have one of the areas, ask the server to send everything again
+function apply_area_updates(seq, areas) {
+    if (updateSeq < 0) {
+        // Already waiting for the server to send everything
+        return;
+    }
+    if (seq !== updateSeq + 1) {
+        request_resync();
+        return;
+    }
+    for (const area of areas) {
+        const block = document.querySelector("[data-area_block=\"" + CSS.escape(area.id) + "\"]");
+        if (!block) {
+            request_resync();
+            return;
+        }
+        block.outerHTML = area.html;
+    }
+    updateSeq = seq;
+}
+
+function request_resync() {
+    updateSeq = -1;
+    send_on_websocket(JSON.stringify({
+        "cmd": "resync",
+        "caller": currentPlayerName
+    }));
+}
+
+function check_state_version(m) {
+    if (m.version !== STATE_VERSION) {
+        add_to_output("### The server sent a newer kind of game state than this page understands, try reloading");
+        return false;
+    }
+    return true;
+}
+
+// The functions below turn the structured game state into the same HTML the server sends with the html
+// protocol, see bwc/server_rendering.py
+function escape_html(s) {
+    return String(s).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+        .replace(/"/g, "&quot;").replace(/'/g, "&#39;");
+}
+
+function render_player(player_name) {
+    return "<span class=\"playerName\">" + player_name + "</span>";
+}
+
+function render_score(score) {
+    const score_class = score < 0 ? "negative-score" : "non-negative-score";
+    return "<span class=\"tag score " + score_class + "\">(" + score + " points)</span>";
+}
+
+function render_area_id(area) {
+    let classes = "area";
+    for (const flag of area.flags) {
+        classes += AREA_FLAG_CLASSES[flag] || "";
+    }
+    let shown_id = area.id;
+    const dot_loc = area.id.indexOf(".");
+    if (dot_loc !== -1) {
+        shown_id = render_player(area.id.substring(0, dot_loc)) + area.id.substring(dot_loc);
+    }
+    return "<span data-area_id=\"" + area.id + "\" class=\"" + classes + "\">" + shown_id + "</span>";
+}
+
+// card is an [id, name] pair, index counts from 1
+function render_card(area, index, card) {
+    return " <span data-area_id=\"" + area.id + "\" data-card_index=\"" + index + "\" data-card_id=\"" + card[0] + "\""
+        + " class='card-click' draggable='true' ondragstart='dragstart_handler(event)'"
+        + " onclick='do_submit(inspect({}, [\"" + area.id + "\", \"" + index + "\"]), \"auto inspect\");'>"
+        + "<span class=\"index\">[" + index + "]</span> <span class=\"card-title\">" + escape_html(card[1]) + "</span></span>";
+}
+
+function render_area(area) {
+    let output = render_area_id(area) + " ";
+    if (area.visible) {
+        if ("score" in area) {
+            output += render_score(area.score);
+        } else {
+            output += "<span class=\"tag visible\">(visible)</span>";
+        }
+        for (let i = 0; i < area.cards.length; i++) {
+            output += "\n" + render_card(area, i + 1, area.cards[i]);
+        }
+    } else {
+        output += "<span class=\"tag card-count\">(" + area.count + " cards)</span>";
+    }
+    return "<span data-area_block=\"" + area.id + "\" ondrop='drop_handler(\"" + area.id + "\", event)'"
+        + " ondragover='dragover_handler(event)'>" + output + "</span>";
+}
+
+function render_state(m) {
+    let hand = [];
+    let play = [];
+    for (const area of m.areas) {
+        if (area.flags.indexOf("PLAY_AREA") !== -1) {
+            play.push(render_area(area));
+        } else {
+            hand.push(render_area(area));
+        }
+    }
+    let play_field = play.join("\n\n");
+    if (m.final && m.players) {
+        // The game is over, show everyone's scores above the areas
+        let scores = m.players.map((player) => render_player(player[0]) + ": " + render_score(player[1]));
+        play_field = scores.join("\n") + "\n\n" + play_field;
+    }
+    document.getElementById("hand-state").innerHTML = hand.join("\n\n");
+    document.getElementById("play-state").innerHTML = play_field;
+}
+
 /// Set the socket callbacks.
 function init_socket(socket) {
     socket.onopen = on_open;
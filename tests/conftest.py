@@ -0,0 +1,40 @@
+import pytest
+
+from bwc.objects import Area, AreaFlag, CardOrder, Game, Player
+from bwc.util import IdAllocator
+
+
+@pytest.fixture
+def make_game():
+    """
+    make_game(*cards) builds a one-player game with a hand, a play area and a draw pile holding
+    the given cards, and returns the game and the player
+    """
+    def make_game(*cards):
+        game = Game()
+        player = Player()
+        player.username = 'alice'
+        game.players[player.username] = player
+        game.current_player = player
+        game.turn_order = [player]
+
+        for area_id, flag in (('alice.hand', AreaFlag.HAND_AREA), ('alice.play', AreaFlag.PLAY_AREA),
+                              ('drawpile', AreaFlag.DRAW_AREA), ('discard', AreaFlag.DISCARD_AREA)):
+            area = Area(area_id=area_id)
+            area.flags = {flag}
+            area.owners = [player] if area_id.startswith('alice') else []
+            game.all_areas[area_id] = area
+        player.hand = game.all_areas['alice.hand']
+        player.area = game.all_areas['alice.play']
+        game.draw = game.all_areas['drawpile']
+        game.discard = game.all_areas['discard']
+        game.center = player.area
+
+        game.draw.contents = list(cards)
+        for card in cards:
+            card._area = game.draw
+        game.all_cards = CardOrder(cards)
+        game.area_ids = IdAllocator(list(game.players) + list(game.all_areas))
+        return game, player
+
+    return make_game
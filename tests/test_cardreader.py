@@ -0,0 +1,135 @@
+import inspect
+import json
+import random
+import subprocess
+import sys
+
+import pytest
+
+from bwc import cardreader
+from bwc.cardreader import CARDS, make_deck, scan_cards
+from bwc.cards import catalog
+from bwc.kernel import Kernel
+from bwc.objects import Card, CardFlag
+
+
+class TestRegistry:
+    def test_every_card_class(self):
+        assert len(CARDS) > 0
+        for class_name, info in CARDS.items():
+            assert info.card_class.__name__ == class_name
+            assert Card in info.card_class.__bases__
+
+    def test_metadata(self):
+        for info in CARDS.values():
+            card = info.card_class()
+            assert (info.name, info.val, info.image) == (card.name, card.val, card.image)
+            assert info.tags == card.tags and info.flags == card.flags
+            assert info.hooks == type(card)._hooks
+
+    def test_immutable(self):
+        with pytest.raises(TypeError):
+            CARDS['NotACard'] = None
+        with pytest.raises(AttributeError):
+            next(iter(CARDS.values())).val = 1000
+
+    def test_manifest_is_up_to_date(self):
+        # If this fails, run `python -m bwc.cardreader --write-manifest`
+        assert list(CARDS.values()) == scan_cards()
+
+    def test_make_deck_does_not_inspect(self, monkeypatch):
+        def getmembers(*args):
+            raise AssertionError("make_deck inspected the card modules")
+
+        monkeypatch.setattr(inspect, 'getmembers', getmembers)
+        deck = make_deck(10, rng=random.Random(1))
+        assert len(deck) == 10
+        assert all(type(card).__name__ in CARDS for card in deck)
+        assert cardreader.read_cards() == [info.card_class for info in CARDS.values()]
+
+
+class TestMakeDeck:
+    def names(self, deck):
+        return [type(card).__name__ for card in deck]
+
+    def test_full_deck(self):
+        assert self.names(make_deck(shuffle=False)) == list(CARDS)
+        assert sorted(self.names(make_deck(rng=random.Random(1)))) == sorted(CARDS)
+
+    def test_small_decks_have_no_copies(self):
+        names = self.names(make_deck(20, rng=random.Random(2)))
+        assert len(names) == len(set(names)) == 20
+
+    def test_large_decks_have_everything(self):
+        names = self.names(make_deck(len(CARDS) * 3, rng=random.Random(3)))
+        assert len(names) == len(CARDS) * 3
+        assert set(names) == set(CARDS)
+
+    def test_seeded(self):
+        assert self.names(make_deck(30, rng=random.Random(4))) == self.names(make_deck(30, rng=random.Random(4)))
+
+    def test_weights(self):
+        everything_else = {name: 0 for name in CARDS}
+        names = self.names(make_deck(50, rng=random.Random(5), weights=dict(everything_else, ding=1, doge=3)))
+        assert set(names) == {'ding', 'doge'}
+        assert names.count('doge') > names.count('ding')
+
+    def test_limits(self):
+        names = self.names(make_deck(len(CARDS) * 4, rng=random.Random(6), limits={'ding': 2, 'doge': 0}))
+        assert names.count('ding') == 2
+        assert 'doge' not in names
+
+    def test_limits_too_tight(self):
+        with pytest.raises(ValueError):
+            make_deck(len(CARDS) + 1, limits={name: 1 for name in CARDS})
+
+
+class TestCatalog:
+    def test_catalog_cards(self):
+        with open(catalog.CATALOG_PATH) as f:
+            entries = json.load(f)
+        assert entries
+        for entry in entries:
+            card_class = getattr(catalog, entry['class'])
+            assert CARDS[entry['class']].card_class is card_class
+            card = card_class()
+            assert (card.name, card.val, card.image) == (entry['name'], entry['val'], entry['image'])
+            assert card.flags == {CardFlag[flag] for flag in entry['flags']} and card.tags == set(entry['tags'])
+            assert card_class._hooks == frozenset()
+            assert not hasattr(card, '__dict__')
+
+    def test_cards_are_independent(self):
+        first, second = catalog.Recursion(), catalog.Recursion()
+        first.tags.add('Copied')
+        first.val = 1
+        assert second.tags == {'Technology'} and second.val == 200
+
+    def test_never_active(self, make_game, monkeypatch):
+        # A handler added after the class was made isn't one the kernel knows about
+        moves = []
+        monkeypatch.setattr(catalog.Recursion, 'on_move', lambda *args: moves.append(args), raising=False)
+        card, other = catalog.Recursion(), catalog.Recursion()
+        game, player = make_game(card, other)
+        kernel = Kernel(game)
+        assert kernel.move_card(card, card, game.draw, player.area)
+        assert kernel.move_card(card, other, game.draw, player.area)
+        assert kernel.score_player(player) == 400
+        assert moves == []
+
+
+class TestLazyLoading:
+    def run(self, code):
+        return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+
+    def test_no_card_modules_at_import(self):
+        code = "import sys, bwc.engine; print(sum(name.startswith('bwc.cards.') for name in sys.modules))"
+        assert self.run(code).strip() == '0'
+
+    def test_only_dealt_cards_are_imported(self):
+        code = ("import random, sys\n"
+                "from bwc.cardreader import CARDS, make_deck\n"
+                "deck = make_deck(3, rng=random.Random(1))\n"
+                "dealt = {CARDS[type(card).__name__].module for card in deck}\n"
+                "loaded = {name[len('bwc.cards.'):] for name in sys.modules if name.startswith('bwc.cards.')}\n"
+                "print(dealt <= loaded, len(loaded) < len(CARDS))")
+        assert self.run(code).split() == ['True', 'True']
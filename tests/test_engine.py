@@ -0,0 +1,38 @@
+from random import Random
+
+from bwc.engine import Engine
+
+
+def make_engine(seed):
+    engine = Engine()
+    engine.reset(None, None)
+    for username in ('alice', 'bob', 'carol'):
+        engine.add_player(username)
+    engine.setup_game(seed=seed)
+    return engine
+
+
+def deal(engine):
+    return [[type(card).__name__ for card in area.contents] for area in engine.game.all_areas.values()]
+
+
+class TestSeeding:
+    def test_same_seed_same_game(self):
+        first, second = make_engine(42), make_engine(42)
+        assert deal(first) == deal(second)
+        assert first.kernel.rng.random() == second.kernel.rng.random()
+
+    def test_different_seeds(self):
+        assert deal(make_engine(1)) != deal(make_engine(2))
+
+    def test_kernel_shares_the_game_rng(self):
+        engine = make_engine(7)
+        assert engine.kernel.rng is engine.game.rng
+
+    def test_only_the_game_rng_is_used(self, monkeypatch):
+        # Ids made outside of a game come from util's own rng, which setting up a game leaves alone
+        outside = Random(3)
+        monkeypatch.setattr('bwc.util._rng', outside)
+        state = outside.getstate()
+        make_engine(7)
+        assert outside.getstate() == state
@@ -1 +1,419 @@
-# whoops guess there aren't any tests here
+from bwc.kernel import Kernel
+from bwc.objects import Area, Card, CardFlag, Player
+
+
+class TestHookSubscriptions:
+    def test_base_card_has_no_hooks(self):
+        assert Card._hooks == frozenset()
+
+    def test_overridden_hooks(self):
+        class Dummy(Card):
+            def init(self):
+                pass
+
+            def on_move(self, kernel, player, card, from_area, to_area, gamestate):
+                pass
+
+            def handle_look(self, kernel, player, area, gamestate):
+                pass
+
+        assert Dummy._hooks == {'on_move', 'handle_look'}
+
+    def test_inherited_hooks(self):
+        class Parent(Card):
+            def init(self):
+                pass
+
+            def on_play(self, kernel, gamestate, player):
+                pass
+
+        class Child(Parent):
+            pass
+
+        assert Child._hooks == {'on_play'}
+
+
+class Recorder(Card):
+    def init(self):
+        self.name = 'Recorder'
+        self.moves = 0
+
+    def on_move(self, kernel, player, card, from_area, to_area, gamestate):
+        self.moves += 1
+
+
+class TestActiveCards:
+    def test_only_cards_in_play_get_events(self, make_game):
+        in_play, in_draw, moved = Recorder(), Recorder(), Recorder()
+        game, player = make_game(in_play, in_draw, moved)
+        kernel = Kernel(game)
+        assert kernel.move_card(in_play, in_play, game.draw, player.area)
+        assert in_play.moves == 1
+
+        assert kernel.move_card(player, moved, game.draw, player.hand)
+        assert in_play.moves == 2
+        assert in_draw.moves == 0
+        assert moved.moves == 0
+
+    def test_leaving_play_stops_events(self, make_game):
+        first, second = Recorder(), Recorder()
+        game, player = make_game(first, second)
+        kernel = Kernel(game)
+        kernel.move_card(first, first, game.draw, player.area)
+        kernel.move_card(first, first, player.area, game.discard)
+        kernel.move_card(second, second, game.draw, player.area)
+        assert first.moves == 1
+        assert second.moves == 1
+
+
+class Awakener(Card):
+    """
+    Flags the card it's told about to always get events, when it's played
+    """
+    def init(self):
+        self.name = 'Awakener'
+        self.target = None
+
+    def on_play(self, kernel, gamestate, player):
+        kernel.get_mutable_card(self, self.target).flags.add(CardFlag.ALWAYS_GET_EVENTS)
+
+
+class TestMutableCards:
+    def test_flag_changes_are_noticed(self, make_game):
+        awakener, sleeper, mover = Awakener(), Recorder(), Recorder()
+        game, player = make_game(awakener, sleeper, mover)
+        kernel = Kernel(game)
+        awakener.target = sleeper
+        assert kernel.move_card(awakener, awakener, game.draw, player.area)
+        kernel.move_card(player, mover, game.draw, player.hand)
+        assert sleeper.moves == 1
+
+    def test_losing_events(self, make_game):
+        first, second = Recorder(), Recorder()
+        game, player = make_game(first, second)
+        first.flags = {CardFlag.ALWAYS_GET_EVENTS}
+        kernel = Kernel(game)
+        kernel.get_mutable_card(first, first).flags.discard(CardFlag.ALWAYS_GET_EVENTS)
+        kernel.move_card(player, second, game.draw, player.hand)
+        assert first.moves == 0
+
+
+class Scorer(Card):
+    def init(self):
+        self.name = 'Scorer'
+        self.val = 100
+        # Appended to rather than replaced, so scoring doesn't count as the card changing
+        self.computed = []
+        self.seen = []
+
+    def handle_score_card(self, kernel, card, gamestate):
+        self.computed.append(card)
+
+    def on_score_card(self, kernel, card, gamestate):
+        self.seen.append(card)
+
+
+class Grower(Card):
+    def init(self):
+        self.name = 'Grower'
+        self.val = 1
+
+    def on_score_card(self, kernel, card, gamestate):
+        self.val += 1
+
+
+class Rescorer(Card):
+    def init(self):
+        self.name = 'Rescorer'
+        self.val = 0
+        self.scores = []
+
+    def on_move(self, kernel, player, card, from_area, to_area, gamestate):
+        for val in (1, 2):
+            self.val = val
+            self.scores.append(kernel.score_card(self))
+
+
+class TestScoreCache:
+    def test_repeated_scores_are_cached(self, make_game):
+        scorer = Scorer()
+        game, player = make_game(scorer)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.score_player(player) == 100
+        assert kernel.score_player(player) == 100
+        assert kernel.score_area(player.area) == 100
+        assert scorer.computed == [scorer]
+
+    def test_on_score_hooks_run_on_cached_scores(self, make_game):
+        scorer = Scorer()
+        game, player = make_game(scorer)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.score_card(scorer) == 100
+        assert kernel.score_card(scorer) == 100
+        assert scorer.computed == [scorer]
+        assert scorer.seen == [scorer, scorer]
+
+    def test_read_only_hooks_changing_their_card(self, make_game):
+        grower = Grower()
+        game, player = make_game(grower)
+        kernel = Kernel(game)
+        kernel.move_card(grower, grower, game.draw, player.area)
+        assert kernel.score_card(grower) == 1
+        assert kernel.score_card(grower) == 2
+
+    def test_scores_inside_handlers_are_not_cached(self, make_game):
+        rescorer = Rescorer()
+        game, player = make_game(rescorer)
+        kernel = Kernel(game)
+        rescorer.flags = {CardFlag.ALWAYS_GET_EVENTS}
+        kernel.move_card(rescorer, rescorer, game.draw, player.area)
+        assert rescorer.scores == [1, 2]
+
+    def test_moves_invalidate_scores(self, make_game):
+        scorer, other = Scorer(), Scorer()
+        game, player = make_game(scorer, other)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.score_area(player.area) == 100
+        version = kernel.version
+        kernel.move_card(scorer, other, game.draw, player.area)
+        assert kernel.version != version
+        assert kernel.score_area(player.area) == 200
+
+    def test_mutable_cards_invalidate_scores(self, make_game):
+        scorer = Scorer()
+        game, player = make_game(scorer)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.score_card(scorer) == 100
+        kernel.get_mutable_card(scorer, scorer).val = 5
+        assert kernel.score_card(scorer) == 5
+
+    def test_volatile_cards_are_not_cached(self, make_game):
+        scorer = Scorer()
+        scorer.flags = {CardFlag.VOLATILE_SCORE}
+        game, player = make_game(scorer)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.score_area(player.area) == 100
+        scorer.val = 7
+        assert kernel.score_area(player.area) == 7
+        assert kernel.score_player(player) == 7
+
+    def test_score_all(self, make_game):
+        first, second = Scorer(), Scorer()
+        game, player = make_game(first, second)
+        kernel = Kernel(game)
+        kernel.move_card(first, first, game.draw, player.area)
+        kernel.move_card(first, second, game.draw, player.area)
+        scoreboard = kernel.score_all()
+        assert scoreboard.players[player] == 200
+        assert scoreboard.areas[player.area] == 200
+        assert scoreboard.cards == {first: 100, second: 100}
+        assert len(first.computed) == 2
+        assert len(first.seen) == 2
+        assert kernel.score_all() is scoreboard
+        assert kernel.score_player(player) == 200
+        assert len(first.computed) == 2
+
+    def test_find_winners(self, make_game):
+        scorer = Scorer()
+        game, player = make_game(scorer)
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.find_winners() == [(player, True, 100)]
+
+    def test_highest_score_wins(self, make_game):
+        scorer = Scorer()
+        game, player = make_game(scorer)
+        loser = Player()
+        loser.username = 'bob'
+        game.players[loser.username] = loser
+        kernel = Kernel(game)
+        kernel.move_card(scorer, scorer, game.draw, player.area)
+        assert kernel.find_winners() == [(player, True, 100), (loser, False, 0)]
+
+
+class TestCreateNewArea:
+    def test_requested_id_is_kept(self, make_game):
+        game, player = make_game()
+        kernel = Kernel(game)
+        new_area = Area()
+        new_area.id = 'pond'
+        area = kernel.create_new_area(None, new_area)
+        assert area.id == 'pond'
+        assert game.all_areas['pond'] is area
+
+    def test_cards_stay_where_they_are(self, make_game):
+        card = Recorder()
+        game, player = make_game(card)
+        kernel = Kernel(game)
+        new_area = Area()
+        new_area.id = 'pond'
+        new_area.contents = [card]
+        area = kernel.create_new_area(None, new_area)
+        assert list(area.contents) == [card]
+        assert card in game.draw.contents and card.area == game.draw
+
+    def test_duplicate_ids_are_numbered(self, make_game):
+        game, player = make_game()
+        kernel = Kernel(game)
+        ids = []
+        for area_id in ('discard', 'discard', 'alice', 'pond', 'pond'):
+            new_area = Area()
+            new_area.id = area_id
+            ids.append(kernel.create_new_area(None, new_area).id)
+        assert ids == ['discard1', 'discard2', 'alice1', 'pond', 'pond1']
+
+
+class TestHookTimings:
+    def test_timing_is_off_by_default(self, make_game, monkeypatch):
+        # Nothing is timed at all, not just left unrecorded
+        clock_reads = []
+        monkeypatch.setattr('bwc.kernel.perf_counter', lambda: clock_reads.append(None) or 0.0)
+        recorder = Recorder()
+        game, player = make_game(recorder)
+        kernel = Kernel(game)
+        assert kernel.move_card(recorder, recorder, game.draw, player.area)
+        assert recorder.moves == 1
+        assert clock_reads == []
+
+    def test_handlers_are_timed(self, make_game):
+        first, second = Recorder(), Recorder()
+        game, player = make_game(first, second)
+        kernel = Kernel(game)
+        timings = {}
+        kernel.time_hooks(timings)
+        kernel.move_card(first, first, game.draw, player.area)
+        calls, elapsed = timings[('Recorder', 'on_move')]
+        assert calls == 1 and elapsed >= 0
+
+        kernel.time_hooks(None)
+        kernel.move_card(second, second, game.draw, player.area)
+        assert timings[('Recorder', 'on_move')][0] == 1
+        assert first.moves == 2
+
+
+class Animal(Card):
+    def init(self):
+        self.name = 'Animal'
+        self.tags = {'Animal'}
+
+
+class Shapeshifter(Card):
+    def init(self):
+        self.name = 'Shapeshifter'
+        self.tags = set()
+
+    def on_play(self, kernel, gamestate, player):
+        self.tags = {'Animal'}
+
+
+class Chameleon(Card):
+    """
+    Takes the name of every card that moves, wherever it moves
+    """
+    def init(self):
+        self.name = 'Chameleon'
+        self.flags = {CardFlag.ALWAYS_GET_EVENTS}
+
+    def on_move(self, kernel, player, card, from_area, to_area, gamestate):
+        self.name = card.name
+
+
+class Tagger(Card):
+    """
+    Tags the card it's told about as an Animal when it's played, and counts the Animals
+    """
+    def init(self):
+        self.name = 'Tagger'
+        self.target = None
+        self.seen = None
+
+    def on_play(self, kernel, gamestate, player):
+        kernel.get_mutable_card(self, self.target).tags.add('Animal')
+        self.seen = kernel.count_tagged('Animal')
+
+
+class TestTagIndex:
+    def test_counts_follow_moves(self, make_game):
+        cards = [Animal(), Animal(), Animal(), Recorder()]
+        game, player = make_game(*cards)
+        kernel = Kernel(game)
+        assert kernel.count_tagged('Animal') == 3
+        assert kernel.count_tagged('Animal', area=game.draw) == 3
+        assert kernel.count_tagged('Animal', owner=player) == 0
+
+        kernel.move_card(cards[0], cards[0], game.draw, player.area)
+        kernel.move_card(cards[1], cards[1], game.draw, player.hand)
+        assert kernel.count_tagged('Animal', owner=player) == 2
+        assert kernel.count_tagged('Animal', area=player.area) == 1
+        assert kernel.count_tagged('Animal', owner=player, area=game.draw) == 0
+        assert set(kernel.tagged_cards('Animal', owner=player)) == {cards[0], cards[1]}
+        assert kernel.count_tagged('Plant') == 0
+
+    def test_changed_tags(self, make_game):
+        shapeshifter, other = Shapeshifter(), Recorder()
+        game, player = make_game(shapeshifter, other)
+        kernel = Kernel(game)
+        assert kernel.count_tagged('Animal') == 0
+        kernel.move_card(shapeshifter, shapeshifter, game.draw, player.area)
+        assert kernel.count_tagged('Animal', area=player.area) == 1
+
+        kernel.get_mutable_card(shapeshifter, other).tags.add('Animal')
+        assert kernel.count_tagged('Animal') == 2
+        assert kernel.tagged_cards('Animal', area=game.draw) == [other]
+
+    def test_tags_changed_in_a_handler(self, make_game):
+        tagger, other = Tagger(), Recorder()
+        game, player = make_game(tagger, other)
+        kernel = Kernel(game)
+        tagger.target = other
+        assert kernel.move_card(tagger, tagger, game.draw, player.area)
+        assert tagger.seen == 1
+        assert kernel.tagged_cards('Animal') == [other]
+
+
+class TestAreaVersions:
+    def test_moves_touch_both_areas(self, make_game):
+        first, second = Recorder(), Recorder()
+        game, player = make_game(first, second)
+        kernel = Kernel(game)
+        hand, discard = kernel.area_version(player.hand), kernel.area_version(game.discard)
+        draw = kernel.area_version(game.draw)
+
+        kernel.move_card(player, first, game.draw, player.hand)
+        assert kernel.area_version(player.hand) != hand
+        assert kernel.area_version(game.draw) != draw
+        assert kernel.area_version(game.discard) == discard
+
+        hand = kernel.area_version(player.hand)
+        kernel.move_card(player, first, player.hand, player.area)
+        assert kernel.area_version(player.hand) != hand
+
+    def test_mutable_cards_touch_their_area(self, make_game):
+        card = Recorder()
+        game, player = make_game(card)
+        kernel = Kernel(game)
+        draw, hand = kernel.area_version(game.draw), kernel.area_version(player.hand)
+        kernel.get_mutable_card(card, card).name = 'Renamed'
+        assert kernel.area_version(game.draw) != draw
+        assert kernel.area_version(player.hand) == hand
+
+    def test_cards_changing_their_looks_touch_their_area(self, make_game):
+        chameleon, recorder = Chameleon(), Recorder()
+        game, player = make_game(recorder, chameleon)
+        kernel = Kernel(game)
+        assert kernel.move_card(chameleon, recorder, game.draw, player.hand)
+        assert chameleon.name == 'Recorder'
+
+        # Moves between areas that don't hold the chameleon, first keeping its name
+        draw = kernel.area_version(game.draw)
+        assert kernel.move_card(chameleon, recorder, player.hand, game.discard)
+        assert kernel.area_version(game.draw) == draw
+        recorder.name = 'Other'
+        assert kernel.move_card(chameleon, recorder, game.discard, player.hand)
+        assert chameleon.name == 'Other'
+        assert kernel.area_version(game.draw) != draw
@@ -0,0 +1,176 @@
+from random import Random
+
+import pytest
+
+from bwc.objects import HAND_AREA, PLAY_ANY_TIME, PLAY_AREA, Area, AreaContents, AreaFlag, Card, CardFlag, CardFlags, \
+    CardOrder, Player
+from bwc.util import immutablize
+
+
+class Blank(Card):
+    def init(self):
+        pass
+
+
+class Tagged(Card):
+    def init(self):
+        self.flags = {CardFlag.PLAY_ANY_TIME}
+        self.counter = 0  # card classes can still add attributes of their own
+
+
+class TestFlags:
+    def test_set_api(self):
+        card = Tagged()
+        assert CardFlag.PLAY_ANY_TIME in card.flags
+        assert CardFlag.NO_PLAY_TO_SELF not in card.flags
+        assert card.flags == {CardFlag.PLAY_ANY_TIME}
+        card.flags.add(CardFlag.VOLATILE_SCORE)
+        assert list(card.flags) == [CardFlag.PLAY_ANY_TIME, CardFlag.VOLATILE_SCORE]
+        card.flags.discard(CardFlag.PLAY_ANY_TIME)
+        assert len(card.flags) == 1
+        assert card.flags.bits == CardFlag.VOLATILE_SCORE.bit
+
+    def test_kinds_dont_mix(self):
+        flags = CardFlags({CardFlag.PLAY_ANY_TIME})
+        assert AreaFlag.PLAY_AREA not in flags
+        with pytest.raises(TypeError):
+            flags.add(AreaFlag.PLAY_AREA)
+
+    def test_assigning_a_set(self):
+        area = Area()
+        area.flags = {AreaFlag.HAND_AREA}
+        assert area.flags == {AreaFlag.HAND_AREA}
+        assert AreaFlag.HAND_AREA in immutablize(area).flags
+
+    def test_flag_bits(self):
+        card, area = Tagged(), Area()
+        area.flags = {AreaFlag.HAND_AREA}
+        assert card.flag_bits & PLAY_ANY_TIME
+        assert area.flag_bits & HAND_AREA and not area.flag_bits & PLAY_AREA
+        area.flags.add(AreaFlag.PLAY_AREA)
+        assert immutablize(area).flag_bits == HAND_AREA | PLAY_AREA
+
+    def test_slots(self):
+        card = Tagged()
+        assert card.counter == 0
+        assert immutablize(card).counter == 0
+        assert immutablize(card).flags == {CardFlag.PLAY_ANY_TIME}
+        with pytest.raises(AttributeError):
+            immutablize(card).flags = set()
+        with pytest.raises(AttributeError):
+            Player().nickname = 'nope'
+
+
+class TestCardOrder:
+    def test_insertion_order(self):
+        cards = [Blank() for _ in range(4)]
+        assert list(CardOrder(cards)) == cards
+
+    def test_bump(self):
+        cards = [Blank() for _ in range(4)]
+        order = CardOrder(cards)
+        order.bump(cards[2])
+        assert [card._uuid for card in order] == [cards[i]._uuid for i in (2, 0, 1, 3)]
+
+    def test_bump_new_card(self):
+        old, new = Blank(), Blank()
+        order = CardOrder([old])
+        order.bump(new)
+        assert order[0] is new
+        assert len(order) == 2
+
+    def test_discard(self):
+        cards = [Blank() for _ in range(3)]
+        order = CardOrder(cards)
+        order.discard(cards[1])
+        order.discard(cards[1])
+        assert cards[1] not in order
+        assert [card._uuid for card in order] == [cards[0]._uuid, cards[2]._uuid]
+
+    def test_place(self):
+        cards = [Blank() for _ in range(5)]
+        order = CardOrder([cards[0], cards[3]])
+        order.place(cards[2], cards)
+        order.place(cards[4], cards)
+        assert [card._uuid for card in order] == [cards[i]._uuid for i in (0, 2, 3, 4)]
+
+    def test_indexing(self):
+        cards = [Blank() for _ in range(3)]
+        order = CardOrder(cards)
+        assert order[-1] is cards[2]
+        with pytest.raises(IndexError):
+            order[3]
+
+
+class TestAreaContents:
+    def test_list_like(self):
+        cards = [Blank() for _ in range(5)]
+        contents = AreaContents(cards)
+        assert len(contents) == 5 and list(contents) == cards == contents
+        assert contents[0] is cards[0] and contents[-1] is cards[4]
+        assert contents[1:3] == cards[1:3]
+        assert contents.index(cards[3]) == 3
+        assert cards[2] in contents and immutablize(cards[2]) in contents and Blank() not in contents
+        with pytest.raises(IndexError):
+            contents[5]
+
+    def test_moves(self):
+        # Every kind of change, checked against a plain list
+        rng = Random(7)
+        cards = [Blank() for _ in range(30)]
+        contents, expected = AreaContents(cards[:10]), cards[:10]
+        outside = cards[10:]
+        for _ in range(500):
+            action = rng.randrange(5)
+            if action == 4 and outside:
+                card = outside.pop()
+                index = rng.randrange(-len(expected) - 1, len(expected) + 2)
+                contents.insert(index, card)
+                expected.insert(index, card)
+            elif action == 0 and outside:
+                card = outside.pop()
+                contents.push_front(card)
+                expected.insert(0, card)
+            elif action == 1 and outside:
+                card = outside.pop()
+                contents.append(card)
+                expected.append(card)
+            elif expected:
+                card = expected.pop(rng.choice([0, -1, rng.randrange(len(expected))]))
+                contents.remove(card)
+                outside.append(card)
+            assert len(contents) == len(expected)
+            if rng.random() < 0.3:
+                assert list(contents) == expected
+                assert all(contents[i] is card for i, card in enumerate(expected))
+                assert all(contents.index(card) == i for i, card in enumerate(expected))
+                assert contents[1:-1:2] == expected[1:-1:2] and contents[::-1] == expected[::-1]
+
+    def test_add(self):
+        cards = [Blank() for _ in range(3)]
+        contents = AreaContents(cards[:2])
+        assert contents + [cards[2]] == cards == [cards[0]] + AreaContents(cards[1:])
+        assert contents + AreaContents(cards[2:]) == cards
+        assert list(contents) == cards[:2]
+
+    def test_iteration_is_a_snapshot(self):
+        cards = [Blank() for _ in range(3)]
+        contents = AreaContents(cards)
+        for card in contents:
+            contents.remove(card)
+        assert len(contents) == 0
+
+    def test_no_duplicates(self):
+        card = Blank()
+        contents = AreaContents([card])
+        with pytest.raises(ValueError):
+            contents.push_front(card)
+        with pytest.raises(ValueError):
+            contents.remove(Blank())
+
+    def test_area(self):
+        cards = [Blank() for _ in range(3)]
+        area = Area()
+        area.contents = cards
+        assert isinstance(area.contents, AreaContents) and area.contents == cards
+        assert len(immutablize(area).contents) == 3 and immutablize(area).contents[0] == cards[0]
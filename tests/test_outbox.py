@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+from bwc.outbox import Outbox, flush_outboxes
+
+
+class FakeWebsocket:
+    """
+    Collects what is sent to it.  Sending waits until the client is let through, to stand in
+    for a slow client
+    """
+    def __init__(self, slow=False):
+        self.sent = []
+        self.through = asyncio.Event()
+        if not slow:
+            self.through.set()
+        self.closed = False
+
+    async def send(self, data):
+        await self.through.wait()
+        self.sent.append(json.loads(data))
+
+    async def send_update(self, final):
+        await self.through.wait()
+        if final == "broken":
+            raise ValueError("rendering failed")
+        self.sent.append(("update", final))
+
+    async def close(self):
+        self.closed = True
+
+
+def run(test):
+    """
+    Runs test(make_outbox) in an event loop, where make_outbox(...) builds an Outbox around a
+    FakeWebsocket made with the same arguments
+    """
+    async def main():
+        def make_outbox(size=8, overflow="coalesce", slow=False):
+            websocket = FakeWebsocket(slow)
+            return Outbox(websocket, websocket.send_update, size, overflow), websocket
+        await test(make_outbox)
+        # Let the disconnects that were started finish
+        await asyncio.sleep(0)
+    asyncio.run(main())
+
+
+def test_sends_in_order():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox()
+        outbox.put_message({"n": 1})
+        outbox.put_update()
+        outbox.put_frame(json.dumps({"n": 2}))
+        outbox.put_update(final=True)
+        await outbox.flush()
+        assert websocket.sent == [{"n": 1}, ("update", False), {"n": 2}, ("update", True)]
+    run(test)
+
+
+def test_failed_items_are_skipped():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox()
+        outbox.put_update("broken")
+        outbox.put_message({"n": 1})
+        await outbox.flush()
+        assert websocket.sent == [{"n": 1}] and not outbox.closed
+    run(test)
+
+
+def test_closed_connections_stop_quietly():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox()
+
+        async def send(data):
+            raise websockets.ConnectionClosedOK(None, None)
+        websocket.send = send
+        outbox.put_message({"n": 1})
+        await outbox.flush()
+        await asyncio.sleep(0)
+        assert outbox.closed and outbox.writer.done() and outbox.writer.exception() is None
+    run(test)
+
+
+def test_coalesce():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox(size=3, slow=True)
+        outbox.put_update()
+        outbox.put_message({"n": 1})
+        outbox.put_update(final=True)
+        outbox.put_update()
+        websocket.through.set()
+        await outbox.flush()
+        assert websocket.sent == [{"n": 1}, ("update", True)]
+        assert not websocket.closed
+    run(test)
+
+
+def test_drop():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox(size=3, overflow="drop", slow=True)
+        outbox.put_update(final=True)
+        outbox.put_message({"n": 1})
+        outbox.put_update()
+        outbox.put_update()
+        websocket.through.set()
+        await outbox.flush()
+        assert websocket.sent == [{"n": 1}, ("update", False), ("update", True)]
+    run(test)
+
+
+def test_disconnect():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox(size=2, overflow="disconnect", slow=True)
+        for _ in range(3):
+            outbox.put_update()
+        await asyncio.sleep(0)
+        assert outbox.closed and websocket.closed
+    run(test)
+
+
+def test_messages_are_never_dropped():
+    async def test(make_outbox):
+        outbox, websocket = make_outbox(size=2, slow=True)
+        outbox.put_message({"type": "choices", "choices": ["yes", "no"]})
+        outbox.put_update()
+        outbox.put_message({"n": 1})
+        outbox.put_update()
+        await asyncio.sleep(0)
+        assert outbox.closed and websocket.closed
+        outbox.put_message({"n": 2})
+        assert not outbox.queue
+    run(test)
+
+
+def test_flush_timeout():
+    async def test(make_outbox):
+        stuck, stuck_websocket = make_outbox(slow=True)
+        fine, fine_websocket = make_outbox()
+        for outbox in (stuck, fine):
+            outbox.put_message({"n": 1})
+        await flush_outboxes([stuck, fine], timeout=0.05)
+        assert fine_websocket.sent == [{"n": 1}] and not fine.closed
+        await asyncio.sleep(0)
+        assert stuck.closed and stuck_websocket.closed
+    run(test)
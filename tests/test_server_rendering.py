@@ -0,0 +1,81 @@
+import json
+
+from bwc.engine import Engine
+from bwc.server_rendering import STATE_VERSION, RenderCache, area_signature, area_state, encode_message, format_area, \
+    game_state
+
+
+def make_engine():
+    engine = Engine()
+    engine.reset(None, None)
+    for username in ('alice', 'bob'):
+        engine.add_player(username)
+    engine.setup_game(seed=5)
+    return engine, engine.get_player('alice')
+
+
+class TestAreaState:
+    def test_visible_area(self):
+        engine, alice = make_engine()
+        state = area_state(engine, alice, alice.hand)
+        assert state['id'] == 'alice.hand' and state['flags'] == ['HAND_AREA'] and state['visible']
+        assert state['cards'] == [[card._uuid, card.name] for card in alice.hand.contents]
+        assert 'score' not in state
+
+    def test_hidden_area(self):
+        engine, alice = make_engine()
+        state = area_state(engine, alice, engine.get_player('bob').hand)
+        assert state == {'id': 'bob.hand', 'flags': ['HAND_AREA'], 'visible': False, 'count': 5}
+
+    def test_play_areas_are_scored(self):
+        engine, alice = make_engine()
+        state = area_state(engine, alice, alice.area)
+        assert state['score'] == engine.kernel.score_area(alice.area)
+
+
+class TestGameState:
+    def test_game_state(self):
+        engine, alice = make_engine()
+        state = game_state(engine, alice)
+        assert state['type'] == 'state' and state['version'] == STATE_VERSION
+        assert [area['id'] for area in state['areas']] == list(engine.game.all_areas)
+        assert 'players' not in state
+
+        final = game_state(engine, alice, final=True)
+        assert final['final'] and [name for name, score in final['players']] == ['alice', 'bob']
+
+    def test_smaller_than_html(self):
+        engine, alice = make_engine()
+        html = [format_area(engine, alice, area) for area in engine.game.all_areas.values()]
+        assert len(json.dumps(game_state(engine, alice))) * 3 < len(json.dumps(html))
+
+
+class TestRenderCache:
+    def render(self, cache, engine, player, area):
+        looked = engine.kernel.look_at(player, area)
+        signature = area_signature(engine, area, looked)
+        return cache.area_html(engine, player, area, None, looked, signature), \
+            cache.area_state(engine, player, area, None, looked, signature)
+
+    def test_same_as_rendering(self):
+        engine, alice = make_engine()
+        html, state = self.render(RenderCache(), engine, alice, alice.hand)
+        assert json.loads(f'"{html}"') == format_area(engine, alice, alice.hand)
+        assert json.loads(state) == area_state(engine, alice, alice.hand)
+
+    def test_shared_between_players(self):
+        engine, alice = make_engine()
+        bob = engine.get_player('bob')
+        cache = RenderCache(engine.kernel.version)
+        for player in (alice, bob):
+            for area in engine.game.all_areas.values():
+                self.render(cache, engine, player, area)
+        # Each hand looks different to its owner, everything else looks the same to both
+        assert len(cache.html) == len(cache.state) == len(engine.game.all_areas) + 2
+
+
+def test_encode_message():
+    assert json.loads(encode_message({"type": "x"}, {"areas": "[1, 2]", "html": '"a\\nb"'})) == \
+        {"type": "x", "areas": [1, 2], "html": "a\nb"}
+    assert encode_message({}, {"a": "1"}) == '{"a": 1}'
+    assert json.loads(encode_message({"a": 1}, {})) == {"a": 1}
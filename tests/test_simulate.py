@@ -0,0 +1,26 @@
+from bwc.simulate import Simulator, format_report
+
+
+class TestSimulator:
+    def test_games_finish(self):
+        results = Simulator(['random', 'greedy', 'random'], seed=1).run(3)
+        assert len(results) == 3
+        for result in results:
+            assert set(result.scores) == {'random0', 'greedy1', 'random2'}
+            assert result.winners
+            assert result.turns > 0 and result.moves > 0
+
+    def test_seeded_runs_repeat(self):
+        first = Simulator(['random', 'random'], seed=7).run(2)
+        second = Simulator(['random', 'random'], seed=7).run(2)
+        assert [result.scores for result in first] == [result.scores for result in second]
+        assert [result.moves for result in first] == [result.moves for result in second]
+
+    def test_hook_timings(self):
+        timings = {}
+        results = Simulator(['greedy', 'greedy'], seed=2, hook_timings=timings).run(2)
+        assert timings
+        for (card, handler), (calls, elapsed) in timings.items():
+            assert handler.startswith(('on_', 'handle_'))
+            assert calls > 0 and elapsed >= 0
+        assert 'games/s' in format_report(results, 1.0, timings)
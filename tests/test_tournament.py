@@ -0,0 +1,43 @@
+import csv
+import json
+
+from bwc.tournament import CSV_FIELDS, run_tournament, write_csv, write_json
+
+
+def without_timings(result):
+    data = result.as_dict()
+    del data['cpu_seconds']
+    for stats in data['cards'].values():
+        del stats['hook_calls'], stats['hook_ms']
+    return data
+
+
+class TestTournament:
+    def test_card_stats(self):
+        result = run_tournament(4, ['random', 'greedy'], workers=1, seed=3)
+        assert result.games == 4
+        assert sum(result.wins.values()) >= 4
+        played = [stats for stats in result.cards.values() if stats.plays]
+        assert played
+        assert sum(stats.plays for stats in played) <= result.moves
+        for stats in played:
+            assert 0 <= stats.win_rate <= 1
+        assert any(stats.hook_calls for stats in result.cards.values())
+
+    def test_workers_dont_change_the_games(self):
+        alone = run_tournament(4, ['random', 'random'], workers=1, seed=5, shards=2)
+        pooled = run_tournament(4, ['random', 'random'], workers=2, seed=5, shards=2)
+        assert without_timings(alone) == without_timings(pooled)
+
+    def test_output_files(self, tmp_path):
+        result = run_tournament(2, ['random', 'random'], workers=1, seed=1)
+        write_csv(result, tmp_path / 'cards.csv')
+        write_json(result, tmp_path / 'cards.json')
+
+        with open(tmp_path / 'cards.csv', newline='') as f:
+            rows = list(csv.DictReader(f))
+        assert list(rows[0]) == CSV_FIELDS
+        assert {row['card'] for row in rows} == set(result.cards)
+
+        with open(tmp_path / 'cards.json') as f:
+            assert json.load(f)['games'] == 2
@@ -1,7 +1,9 @@
+import weakref
+
 import pytest
 
-from bwc.objects import Player
-from bwc.util import immutablize
+from bwc.objects import Player, structurally_equal
+from bwc.util import WORDS, IdAllocator, ViewCache, immutablize, prepare_proxies, proxy_class, random_id
 
 
 class TestImmutablize:
@@ -32,7 +34,20 @@ class TestImmutablize:
 
     def test_equality_2(self):
         # Player is an easy object with a custom __eq__ defined
-        assert immutablize(Player()) == immutablize(Player())
+        player = Player()
+        assert immutablize(player) == immutablize(player)
+        assert immutablize(player) == player
+        assert player == immutablize(player)
+
+    def test_equality_identity(self):
+        # Game objects are only equal to themselves, however similar they look
+        assert immutablize(Player()) != immutablize(Player())
+        assert structurally_equal(immutablize(Player()), Player())
+
+    def test_hash(self):
+        player = Player()
+        assert hash(immutablize(player)) == hash(player)
+        assert immutablize(player) in {player}
 
     def test_arrays_1(self):
         assert immutablize([1, 2, 3])[2] == 3
@@ -43,7 +58,9 @@ class TestImmutablize:
 
     def test_contains_1(self):
         assert 7 in immutablize([1, 2, 3, 4, 5, 6, 7])
-        assert Player() in immutablize([Player(), None, 5])
+        player = Player()
+        assert player in immutablize([player, None, 5])
+        assert Player() not in immutablize([player, None, 5])
 
     def test_function_call(self):
         immutablize({2: 1, 3: 5}).values()
@@ -55,6 +72,30 @@ class TestImmutablize:
     def test_non_subclassable(self):
         assert 2 in immutablize(range(10))
 
+    def test_local_classes(self):
+        # Classes that are created and thrown away may reuse each other's ids; each must still get its own proxy
+        for i in range(50):
+            class Dummy:
+                value = i
+
+                def get(self):
+                    return self.value
+
+            assert immutablize(Dummy()).get() == i
+            assert type(immutablize(Dummy())).__mro__[1] is Dummy
+
+    def test_proxy_class_reused(self):
+        assert type(immutablize([1])) is type(immutablize([2])) is proxy_class(list)
+        assert type(immutablize(Player())) is proxy_class(Player)
+
+    def test_prepare_proxies(self):
+        class Dummy:
+            pass
+
+        prepare_proxies([Dummy])
+        assert '_proxy_class' in vars(Dummy)
+        assert type(immutablize(Dummy())) is vars(Dummy)['_proxy_class']
+
     # TODO: make this test work! Currently, the objects returned when iterating over a list are not immutable,
     # because we can't proxy a `list_iterator` object, as
     # def test_iteration_immutable(self):
@@ -62,3 +103,80 @@ class TestImmutablize:
     #     for x in obj:
     #         with pytest.raises(AttributeError):
     #             x.name = "test"
+
+
+class TestViewCache:
+    def test_same_view(self):
+        views = ViewCache([Player])
+        player = Player()
+        assert views.view(player) is views.view(player)
+
+    def test_nested_views_are_shared(self):
+        views = ViewCache([Player])
+        player = Player()
+        player.hand = Player()
+        assert views.view(player).hand is views.view(player.hand)
+
+    def test_other_views_are_not_kept(self):
+        class Temporary:
+            pass
+
+        views = ViewCache([Player])
+        player = Player()
+        player.hand = [Player()]
+        assert views.view(player).hand is not views.view(player.hand)
+        assert views.view(player).hand[0] is views.view(player.hand[0])
+
+        temporary = Temporary()
+        views.view(temporary)
+        gone = weakref.ref(temporary)
+        del temporary
+        assert gone() is None
+
+    def test_views_are_read_only(self):
+        views = ViewCache()
+        player = Player()
+        player.hand = [1, 2]
+        with pytest.raises(AttributeError):
+            views.view(player).score = 3
+        with pytest.raises(AttributeError):
+            views.view(player).hand[0] = 3
+
+    def test_views_see_changes(self):
+        views = ViewCache()
+        player = Player()
+        view = views.view(player)
+        player.score = 12
+        assert view.score == 12
+
+    def test_clear(self):
+        views = ViewCache([Player])
+        player = Player()
+        view = views.view(player)
+        views.clear()
+        assert views.view(player) is not view
+        assert views.view(player) == view
+
+
+class TestIdAllocator:
+    def test_free_id_is_kept(self):
+        ids = IdAllocator(['center'])
+        assert ids.allocate('pond') == 'pond'
+        assert 'pond' in ids
+
+    def test_collisions_are_numbered(self):
+        ids = IdAllocator(['center', 'center2'])
+        assert [ids.allocate('center') for _ in range(3)] == ['center1', 'center3', 'center4']
+
+    def test_unique_does_not_reserve(self):
+        ids = IdAllocator()
+        assert ids.unique('pond') == 'pond'
+        assert 'pond' not in ids
+
+    def test_random_ids(self):
+        ids = IdAllocator()
+        allocated = {ids.allocate() for _ in range(len(WORDS) + 10)}
+        assert len(allocated) == len(WORDS) + 10
+
+    def test_random_id_disallowed(self):
+        assert random_id(set(WORDS[1:])) == WORDS[0]